@@ -0,0 +1,118 @@
+"""Synthetic catalogs and invoices with known line items.
+
+Everything is generated from a seed, so two runs of the benchmark see the
+same documents and catalogs.
+"""
+
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+WORDS = (
+    "paracetamol ibuprofen amoxicillin vitamin zinc omega calcium iron syrup tablet capsule drops "
+    "cream gel sachet injection steel copper cable bolt washer bearing valve pipe flange gasket "
+    "resin powder granule film sheet roll carton pallet drum freight customs handling"
+).split()
+UNITS = ("10mg", "50mg", "100mg", "250ml", "500ml", "1kg", "5kg", "25kg", "M8", "M10", "2in", "4in")
+COMPANY_WORDS = (
+    "Acme Global Northern Crescent Indus Pioneer Summit Royal Metro Pacific Allied United Prime "
+    "Eastern Star Capital Valley Trading Traders Industries Pharma Logistics Enterprises"
+).split()
+
+PAGE_SIZE = (2480, 3508)  # A4 at 300 DPI
+MARGIN = 150
+COLUMN_STARTS = (MARGIN, 1400, 1750, 2050)
+
+
+def make_catalog(size, seed=0):
+    """Item rows as Item.get_all would return them: item_code and item_name"""
+    rng = random.Random(seed)
+    catalog = []
+    for index in range(size):
+        name = " ".join(rng.sample(WORDS, rng.randint(2, 3)) + [rng.choice(UNITS)]).title()
+        catalog.append({"item_code": f"ITM-{index:06d}", "item_name": f"{name} {index}"})
+    return catalog
+
+
+def make_parties(size, seed=0):
+    """Supplier rows as Supplier.get_all would return them"""
+    rng = random.Random(seed)
+    parties = []
+    for index in range(size):
+        name = " ".join(rng.sample(COMPANY_WORDS, 3))
+        parties.append({
+            "name": f"SUP-{index:05d}",
+            "supplier_name": f"{name} {index}",
+            "tax_id": f"{rng.randint(1000000, 9999999)}-{rng.randint(0, 9)}",
+        })
+    return parties
+
+
+def make_invoice(catalog, parties, line_count, seed=0):
+    """An invoice of line_count catalog items; lines are (item_code, description, qty, rate)"""
+    rng = random.Random(seed)
+    lines = []
+    for item in rng.sample(catalog, min(line_count, len(catalog))):
+        lines.append((item["item_code"], item["item_name"], rng.randint(1, 500), round(rng.uniform(1, 5000), 2)))
+    return {"party": rng.choice(parties), "lines": lines}
+
+
+def invoice_text(invoice):
+    """The text OCR produces for a rendered invoice, item rows in the "cell | cell" table format"""
+    party = invoice["party"]
+    rows = [
+        f"{description} | {qty:,.3f} | {rate:,.2f} | {qty * rate:,.2f}"
+        for _, description, qty, rate in invoice["lines"]
+    ]
+    return "\n".join([
+        "TAX INVOICE",
+        f"Partner Name: {party['supplier_name']}",
+        "Invoice Date: 2025-06-01",
+        "",
+        "DESCRIPTION | QUANTITY | UNIT PRICE | AMOUNT",
+        *rows,
+        "",
+        f"TOTAL {sum(qty * rate for _, _, qty, rate in invoice['lines']):,.2f}",
+    ]) + "\n"
+
+
+def get_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+
+def render_invoice(invoice, rows_per_page=30):
+    """Render an invoice as ruled-table pages at 300 DPI, returning PIL images"""
+    font = get_font(36)
+    pages = []
+    lines = invoice["lines"]
+    for start in range(0, max(len(lines), 1), rows_per_page):
+        page = Image.new("L", PAGE_SIZE, 255)
+        draw = ImageDraw.Draw(page)
+        draw.text((MARGIN, 150), "TAX INVOICE", font=get_font(60), fill=0)
+        draw.text((MARGIN, 280), f"Partner Name: {invoice['party']['supplier_name']}", font=font, fill=0)
+        draw.text((MARGIN, 340), "Invoice Date: 2025-06-01", font=font, fill=0)
+
+        top = 500
+        row_height = 70
+        page_lines = lines[start:start + rows_per_page]
+        bottom = top + row_height * (len(page_lines) + 1)
+        right = PAGE_SIZE[0] - MARGIN
+        for row in range(len(page_lines) + 2):
+            draw.line((MARGIN - 20, top + row * row_height, right, top + row * row_height), fill=0, width=3)
+        for x in COLUMN_STARTS[1:] + (right,):
+            draw.line((x - 20, top, x - 20, bottom), fill=0, width=3)
+        draw.line((MARGIN - 20, top, MARGIN - 20, bottom), fill=0, width=3)
+
+        cells = [("DESCRIPTION", "QUANTITY", "UNIT PRICE", "AMOUNT")] + [
+            (description, f"{qty:,.3f}", f"{rate:,.2f}", f"{qty * rate:,.2f}")
+            for _, description, qty, rate in page_lines
+        ]
+        for row, values in enumerate(cells):
+            for x, value in zip(COLUMN_STARTS, values):
+                draw.text((x, top + row * row_height + 15), value, font=font, fill=0)
+        pages.append(page)
+    return pages
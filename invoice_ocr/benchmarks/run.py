@@ -0,0 +1,328 @@
+"""Offline benchmark of the OCR and matching hot paths.
+
+    python -m invoice_ocr.benchmarks.run --output results.json
+    python -m invoice_ocr.benchmarks.run --baseline baseline.json
+
+Runs on synthetic invoices and catalogs (see corpus) without a site: the
+controller code runs as is, with the frappe.get_all calls that build the
+catalogs answered from the synthetic rows. Needs the frappe package from
+the bench virtualenv for the controller benchmarks and the tesseract binary
+for the OCR one; whatever is unavailable is reported as skipped.
+
+Each benchmark reports throughput, p50/p95 latency and the peak memory
+traced while running it. --baseline compares p50 latencies against an
+earlier --output file and exits with 1 when one regressed by more than
+--threshold.
+"""
+
+import argparse
+import json
+import math
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from invoice_ocr.benchmarks import corpus
+
+DEFAULT_CATALOG_SIZES = (1000, 10000, 100000)
+
+
+class Skipped(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of a non empty list"""
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def measure(func, inputs, repeat=1):
+    """Time func over every input, then trace the peak memory of one more call"""
+    latencies = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            func(value)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(inputs[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "calls": len(latencies),
+        "throughput": len(latencies) / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def import_controller():
+    try:
+        from invoice_ocr.invoice_ocr.doctype.invoice_upload import invoice_upload
+    except ImportError as e:
+        raise Skipped(f"frappe is not importable: {e}")
+    return invoice_upload
+
+
+def get_all_from(rows):
+    """Stand-in for frappe.get_all answering with synthetic rows"""
+    import frappe
+
+    def get_all(doctype, *args, **kwargs):
+        return [frappe._dict(row) for row in rows[doctype]]
+    return get_all
+
+
+def make_upload(invoice_upload, party_type="Supplier"):
+    # The extractors and matchers only read party_type, no database document is needed
+    doc = invoice_upload.InvoiceUpload.__new__(invoice_upload.InvoiceUpload)
+    doc.party_type = party_type
+    return doc
+
+
+def make_invoices(items, args):
+    parties = corpus.make_parties(args.parties, seed=args.seed)
+    return [corpus.make_invoice(items, parties, args.lines, seed=args.seed + number) for number in range(args.invoices)]
+
+
+def bench_preprocess(invoices, args):
+    from invoice_ocr.ocr import preprocess
+
+    pages = [page for invoice in invoices for page in corpus.render_invoice(invoice)][:args.pages]
+    return measure(lambda page: preprocess.preprocess_image(page, preprocess.DEFAULT_PARAMS, dpi=300), pages)
+
+
+def bench_ocr(invoices, args):
+    if not shutil.which("tesseract"):
+        raise Skipped("tesseract is not installed")
+    from invoice_ocr.ocr import pipeline
+
+    options = pipeline.get_options(lang="eng")
+    pages = [page for invoice in invoices for page in corpus.render_invoice(invoice)][:args.ocr_pages]
+    return measure(lambda page: pipeline.ocr_image(page, options, dpi=300), pages)
+
+
+def bench_ocr_adaptive(invoices, args):
+    """Page OCR with a 150 DPI first pass, escalating low confidence pages to 300 DPI"""
+    if not shutil.which("tesseract"):
+        raise Skipped("tesseract is not installed")
+    from invoice_ocr.ocr import pipeline
+
+    options = pipeline.get_options(lang="eng", first_pass_dpi=150)
+    pages = [page for invoice in invoices for page in corpus.render_invoice(invoice)][:args.ocr_pages]
+    result = measure(lambda page: pipeline.ocr_adaptive(
+        lambda options, dpi: pipeline.read_image(page, options, dpi), options
+    ), pages)
+    result["escalated"] = sum(
+        pipeline.ocr_adaptive(lambda options, dpi: pipeline.read_image(page, options, dpi), options)["escalated"]
+        for page in pages
+    ) / len(pages)
+    return result
+
+
+def bench_extract_items(invoices, args):
+    upload = make_upload(import_controller())
+    texts = [corpus.invoice_text(invoice) for invoice in invoices]
+    result = measure(upload.extract_items, texts, repeat=args.repeat)
+
+    found = sum(len(upload.extract_items(text)) for text in texts)
+    expected = sum(len(invoice["lines"]) for invoice in invoices)
+    result["recall"] = found / expected
+    return result
+
+
+def bench_item_match(invoices, args, size):
+    invoice_upload = import_controller()
+    from invoice_ocr import catalog
+    from invoice_ocr.matching import FuzzyIndex
+
+    items = corpus.make_catalog(size, seed=args.seed)
+    with mock.patch("frappe.get_all", get_all_from({"Item": items})):
+        start = time.perf_counter()
+        index = FuzzyIndex(catalog.build_item_entries())
+        build_time = time.perf_counter() - start
+
+    upload = make_upload(invoice_upload)
+    # Invoices drawn from this catalog, so every description has a right answer
+    queries = [
+        (code, description)
+        for invoice in make_invoices(items, args) for code, description, _, _ in invoice["lines"]
+    ][:args.queries]
+    result = measure(lambda query: upload.fuzzy_match_item(query[1], index), queries)
+
+    matched = sum(
+        1 for code, description in queries
+        if (upload.fuzzy_match_item(description, index) or {}).get("item_name") == code
+    )
+    result["accuracy"] = matched / len(queries)
+    result["index_build_s"] = build_time
+    return result
+
+
+def bench_party_match(invoices, args):
+    invoice_upload = import_controller()
+    from invoice_ocr import catalog
+    from invoice_ocr.matching import FuzzyIndex
+
+    parties = corpus.make_parties(args.parties, seed=args.seed)
+    with mock.patch("frappe.get_all", get_all_from({"Supplier": parties})):
+        index = FuzzyIndex(catalog.build_party_entries("Supplier"))
+
+    upload = make_upload(invoice_upload)
+    names = [invoice["party"]["supplier_name"] for invoice in invoices]
+    with mock.patch.object(invoice_upload, "get_party_index", return_value=index):
+        return measure(upload.fuzzy_match_party, names, repeat=args.repeat)
+
+
+# Runs in a fresh interpreter: import time and RSS growth of the controller, and whether it loaded the OCR stack
+IMPORT_PROBE = """
+import json, resource, sys, time
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import frappe
+frappe_time = time.perf_counter()
+frappe_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+from invoice_ocr.invoice_ocr.doctype.invoice_upload import invoice_upload
+print(json.dumps({
+    "seconds": time.perf_counter() - frappe_time,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - frappe_rss,
+    "ocr_stack": sorted(set(sys.modules) & {"cv2", "numpy", "pytesseract", "pdf2image", "PyPDF2", "tesserocr"}),
+}))
+"""
+
+
+def bench_controller_import(args):
+    """What a web worker pays to load the Invoice Upload controller, on top of frappe"""
+    import_controller()
+    runs = []
+    for _ in range(args.repeat):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout))
+
+    latencies = [run["seconds"] for run in runs]
+    return {
+        "calls": len(runs),
+        "throughput": len(runs) / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        # ru_maxrss is in KiB on Linux
+        "peak_memory_kb": max(run["rss_kb"] for run in runs),
+        "ocr_stack": runs[0]["ocr_stack"],
+    }
+
+
+def run(args):
+    items = corpus.make_catalog(max(args.catalog_sizes), seed=args.seed)
+    invoices = make_invoices(items, args)
+
+    benchmarks = [
+        ("import_controller", lambda: bench_controller_import(args)),
+        ("preprocess_image", lambda: bench_preprocess(invoices, args)),
+        ("ocr_image", lambda: bench_ocr(invoices, args)),
+        ("ocr_image_adaptive", lambda: bench_ocr_adaptive(invoices, args)),
+        ("extract_items", lambda: bench_extract_items(invoices, args)),
+        *(
+            (f"fuzzy_match_item[{size}]", lambda size=size: bench_item_match(invoices, args, size))
+            for size in args.catalog_sizes
+        ),
+        (f"fuzzy_match_party[{args.parties}]", lambda: bench_party_match(invoices, args)),
+    ]
+
+    results = {}
+    for name, bench in benchmarks:
+        if args.only and not any(part in name for part in args.only):
+            continue
+        try:
+            results[name] = bench()
+        except Skipped as e:
+            results[name] = {"skipped": str(e)}
+        print(format_result(name, results[name]), flush=True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tesseract": shutil.which("tesseract") is not None,
+        },
+        "settings": {
+            "seed": args.seed, "invoices": args.invoices, "lines": args.lines,
+            "catalog_sizes": list(args.catalog_sizes), "parties": args.parties,
+        },
+        "results": results,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def format_result(name, result):
+    if "skipped" in result:
+        return f"{name:32} skipped: {result['skipped']}"
+    extra = "".join(
+        f"  {key} {result[key]:.3f}" for key in ("recall", "accuracy", "escalated", "index_build_s") if key in result
+    )
+    if "ocr_stack" in result:
+        extra += f"  loads {', '.join(result['ocr_stack']) or 'no OCR modules'}"
+    return (
+        f"{name:32} {result['throughput']:10.1f}/s  p50 {result['p50_ms']:9.3f} ms"
+        f"  p95 {result['p95_ms']:9.3f} ms  peak {result['peak_memory_kb']:9.0f} KiB{extra}"
+    )
+
+
+def compare(report, baseline, threshold):
+    """Print p50 changes against the baseline and return the names that regressed"""
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if "skipped" in result or not before or "skipped" in before:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:32} p50 {before['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p50 slowdown counted as a regression")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=25, help="line items per invoice")
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=DEFAULT_CATALOG_SIZES)
+    parser.add_argument("--parties", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200, help="item descriptions matched per catalog")
+    parser.add_argument("--pages", type=int, default=5, help="pages preprocessed")
+    parser.add_argument("--ocr-pages", type=int, default=3, help="pages OCRed")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(f"max RSS {report['max_rss_mb']:.0f} MiB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
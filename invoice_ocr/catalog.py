@@ -0,0 +1,154 @@
+"""Per-site cache of the fuzzy indexes used to match OCR text to masters.
+
+Indexes are kept in worker memory and in redis, tagged with a version that
+the doc_events in hooks.py bump whenever a relevant master changes. The
+compiled extraction templates are cached the same way, and the default
+income and expense accounts are resolved once per company.
+"""
+
+import re
+
+import frappe
+
+from invoice_ocr.matching import FuzzyIndex
+
+CACHE_PREFIX = "invoice_ocr:index"
+
+# (site, name) -> (version, FuzzyIndex or other built value)
+_indexes = {}
+
+
+def get_index(name, build_entries, factory=FuzzyIndex):
+    """Return the cached factory(entries) called name, rebuilding it when its version changed"""
+    cache = frappe.cache()
+    version_key = f"{CACHE_PREFIX}:{name}:version"
+    index_key = f"{CACHE_PREFIX}:{name}"
+
+    version = cache.get_value(version_key)
+    if not version:
+        version = frappe.generate_hash(length=10)
+        cache.set_value(version_key, version)
+
+    local_key = (frappe.local.site, name)
+    cached = _indexes.get(local_key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    cached = cache.get_value(index_key)
+    if not cached or cached[0] != version:
+        cached = (version, factory(build_entries()))
+        cache.set_value(index_key, cached)
+
+    _indexes[local_key] = cached
+    return cached[1]
+
+
+def invalidate_index(name):
+    cache = frappe.cache()
+    cache.set_value(f"{CACHE_PREFIX}:{name}:version", frappe.generate_hash(length=10))
+    cache.delete_value(f"{CACHE_PREFIX}:{name}")
+
+
+def build_item_entries():
+    """Normalized item codes and names of all active items"""
+    items = frappe.get_all("Item",
+                          fields=["item_code", "item_name"],
+                          filters={"disabled": 0})
+
+    # Create a list of all possible names and codes
+    item_data = []
+    for item in items:
+        # Add item code as primary identifier
+        if item.item_code:
+            item_data.append({
+                "item_name": item.item_code,  # Actual item code
+                "match_text": re.sub(r'[\[\]]', '', item.item_code.lower()),
+                "type": "code"
+            })
+
+        # Add item name as secondary identifier
+        if item.item_name and item.item_name.lower() != item.item_code.lower():
+            item_data.append({
+                "item_name": item.item_code,  # Still use item code as identifier
+                "match_text": re.sub(r'[\[\]]', '', item.item_name.lower()),
+                "type": "name"
+            })
+
+    return item_data
+
+
+def get_item_index():
+    return get_index("Item", build_item_entries)
+
+
+def on_item_change(doc, method=None, *args):
+    """doc_events handler: drop the item index when a field it is built from changes"""
+    if method == "on_update" and not (
+        doc.has_value_changed("item_name") or doc.has_value_changed("disabled")
+    ):
+        return
+    invalidate_index("Item")
+
+
+PARTY_NAME_FIELDS = {"Customer": "customer_name", "Supplier": "supplier_name"}
+
+
+def normalize_tax_id(text):
+    return re.sub(r'\W+', '', text or '').lower()
+
+
+def build_party_entries(party_type):
+    """Normalized names, document names and tax IDs of all parties of a type"""
+    name_field = PARTY_NAME_FIELDS[party_type]
+    parties = frappe.get_all(party_type, fields=["name", name_field, "tax_id"])
+
+    entries = []
+    for party in parties:
+        party_name = party.get(name_field) or party.name
+        entries.append({"name": party.name, "match_text": party_name.lower(), "match_name": party_name, "type": "name"})
+
+        # The document name is an alias when naming is by series or was renamed
+        if party.name.lower() != party_name.lower():
+            entries.append({"name": party.name, "match_text": party.name.lower(), "match_name": party_name, "type": "name"})
+
+        if normalize_tax_id(party.tax_id):
+            entries.append({"name": party.name, "match_text": normalize_tax_id(party.tax_id), "match_name": party_name, "type": "tax_id"})
+
+    return entries
+
+
+def get_party_index(party_type):
+    return get_index(f"party:{party_type}", lambda: build_party_entries(party_type))
+
+
+def on_party_change(doc, method=None, *args):
+    """doc_events handler: drop the party index when a field it is built from changes"""
+    if method == "on_update" and not (
+        doc.has_value_changed(PARTY_NAME_FIELDS[doc.doctype]) or doc.has_value_changed("tax_id")
+    ):
+        return
+    invalidate_index(f"party:{doc.doctype}")
+
+
+ACCOUNT_CACHE_KEY = "invoice_ocr:default_account"
+DEFAULT_ACCOUNT_FIELDS = {"Expense": "default_expense_account", "Income": "default_income_account"}
+
+
+def get_default_account(company, account_type):
+    """The company's default Expense or Income account, else its first ledger of that type, cached per company"""
+    def resolve():
+        account = frappe.db.get_value("Company", company, DEFAULT_ACCOUNT_FIELDS[account_type])
+        if not account:
+            account = frappe.db.get_value("Account", {
+                "account_type": account_type,
+                "company": company,
+                "is_group": 0
+            }, "name")
+        return account
+
+    return frappe.cache().hget(ACCOUNT_CACHE_KEY, f"{company}:{account_type}", generator=resolve)
+
+
+def on_account_change(doc, method=None, *args):
+    """doc_events handler: drop the resolved default accounts when a Company or Account changes"""
+    frappe.cache().delete_value(ACCOUNT_CACHE_KEY)
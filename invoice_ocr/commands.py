@@ -0,0 +1,14 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("watch-invoice-folders")
+@pass_context
+def watch_invoice_folders(context):
+    """Create Invoice Uploads from files dropped into the folders in invoice_ocr_watch_folders"""
+    from invoice_ocr.ingestion import watch
+
+    watch(get_site(context))
+
+
+commands = [watch_invoice_folders]
@@ -0,0 +1,118 @@
+"""Per-supplier extraction templates.
+
+An OCR Extraction Template describes one invoice layout: phrases that
+identify it, regexes for the lines that open and close the item table, one
+regex whose named groups pick the columns out of an item line, and
+optionally one for the party. Templates are compiled once when the registry
+is loaded, so a matched document gets a single targeted pass instead of
+every generic extractor in turn.
+"""
+
+import re
+
+# Fingerprint phrases are looked for in this much of the document
+HEADER_CHARS = 1500
+ROW_GROUPS = ("description", "rate")
+
+
+def parse_number(text):
+    return float(text.replace(",", "").strip())
+
+
+def clean_description(description):
+    description = re.sub(r'\s+', ' ', description)  # Collapse spaces
+    description = re.sub(r'\.{3,}', '', description)  # Remove ellipses
+    return re.sub(r'^\W+|\W+$', '', description)  # Remove surrounding symbols
+
+
+class ExtractionTemplate:
+    """A compiled OCR Extraction Template; raises ValueError for an unusable rule"""
+
+    def __init__(self, name, row_pattern, fingerprint=None, table_start=None, table_end=None,
+                 party_pattern=None, party_type=None, party=None, priority=0):
+        self.name = name
+        self.party_type = party_type
+        self.party = party
+        self.priority = priority or 0
+        self.fingerprint = [phrase.strip().upper() for phrase in (fingerprint or "").splitlines() if phrase.strip()]
+
+        self.table_start = self.compile("Table Start", table_start, re.IGNORECASE | re.MULTILINE)
+        self.table_end = self.compile("Table End", table_end, re.IGNORECASE | re.MULTILINE)
+        self.row_pattern = self.compile("Row Pattern", row_pattern, re.IGNORECASE)
+        self.party_pattern = self.compile("Party Pattern", party_pattern, re.IGNORECASE | re.MULTILINE)
+
+        if not self.row_pattern:
+            raise ValueError("Row Pattern is required")
+        missing = [group for group in ROW_GROUPS if group not in self.row_pattern.groupindex]
+        if missing:
+            raise ValueError(f"Row Pattern needs the named groups: {', '.join(missing)}")
+        if self.party_pattern and "party" not in self.party_pattern.groupindex:
+            raise ValueError("Party Pattern needs a named group: party")
+
+    @staticmethod
+    def compile(label, pattern, flags):
+        if not pattern:
+            return None
+        try:
+            return re.compile(pattern, flags)
+        except re.error as e:
+            raise ValueError(f"Invalid {label}: {e}")
+
+    def matches(self, party_type, party, header):
+        """Whether this template applies to a document of party (if known) with header text"""
+        if self.party:
+            if party:
+                return self.party_type == party_type and self.party == party
+            if not self.fingerprint:
+                return False
+        return bool(self.fingerprint) and all(phrase in header for phrase in self.fingerprint)
+
+    def get_table_text(self, text):
+        start = 0
+        if self.table_start:
+            match = self.table_start.search(text)
+            if not match:
+                return ""
+            # Rows start on the line after the one holding the anchor
+            line_end = text.find("\n", match.end())
+            start = len(text) if line_end == -1 else line_end + 1
+
+        end = len(text)
+        if self.table_end:
+            match = self.table_end.search(text, start)
+            if match:
+                end = text.rfind("\n", start, match.start()) + 1 or start
+        return text[start:end]
+
+    def extract_items(self, text):
+        items = []
+        for line in self.get_table_text(text).splitlines():
+            match = self.row_pattern.search(line)
+            if not match:
+                continue
+            try:
+                qty = match.groupdict().get("qty")
+                items.append({
+                    "description": clean_description(match.group("description")),
+                    "qty": parse_number(qty) if qty else 1,
+                    "rate": parse_number(match.group("rate")),
+                })
+            except (TypeError, ValueError):
+                continue
+        return [item for item in items if len(item["description"]) >= 3]
+
+    def extract_party(self, text):
+        if not self.party_pattern:
+            return None
+        match = self.party_pattern.search(text)
+        party = match and match.group("party")
+        return party.strip() if party and party.strip() else None
+
+
+def find_template(templates, party_type, party, text):
+    """The highest priority template for the document, party templates before fingerprint ones"""
+    header = text[:HEADER_CHARS].upper()
+    matching = [template for template in templates if template.matches(party_type, party, header)]
+    if not matching:
+        return None
+    return max(matching, key=lambda template: (bool(template.party and party), template.priority))
@@ -0,0 +1,92 @@
+"""Pickup of new files dropped into local directories.
+
+Scanners write into a shared directory, often slowly and sometimes over
+SMB or NFS. A file is handed out once its size and modification time have
+stayed the same for settle_seconds, so half written PDFs are never read.
+Each directory is rescanned every scan_interval seconds. With inotify_simple
+installed, a close or move in a watched directory wakes the watcher at once;
+inotify misses writes made over the network, so the rescans still run.
+
+A file is handed out again only if it changes. The caller decides what an
+unchanged file's content means (see invoice_ocr.ingestion, which skips
+content it has seen before).
+"""
+
+import os
+import time
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class FolderWatcher:
+    def __init__(self, folders, extensions, settle_seconds=5, scan_interval=30):
+        self.folders = list(folders)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.settle_seconds = settle_seconds
+        self.scan_interval = scan_interval
+        # path -> (size, mtime) of files handed out
+        self.handled = {}
+        # path -> ((size, mtime), time the signature was first seen)
+        self.settling = {}
+        self.inotify = None
+
+        if INotify:
+            self.inotify = INotify()
+            for folder in self.folders:
+                self.inotify.add_watch(folder, flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE)
+
+    def list_files(self):
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                # Hidden and temporary files are still being written by someone
+                if entry.name.startswith((".", "~")) or not entry.name.lower().endswith(self.extensions):
+                    continue
+                if entry.is_file():
+                    yield entry.path, entry.stat()
+
+    def scan(self, now=None):
+        """Paths of new or changed files that have settled, oldest first"""
+        now = time.monotonic() if now is None else now
+        present = set()
+        ready = []
+        for path, stat in self.list_files():
+            present.add(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if not stat.st_size or self.handled.get(path) == signature:
+                continue
+
+            known, since = self.settling.get(path, (None, now))
+            if known != signature:
+                self.settling[path] = (signature, now)
+            elif now - since >= self.settle_seconds:
+                ready.append((stat.st_mtime_ns, path))
+
+        # Forget files that were moved away or deleted
+        for path in set(self.settling) - present:
+            del self.settling[path]
+        for path in set(self.handled) - present:
+            del self.handled[path]
+
+        return [path for _, path in sorted(ready)]
+
+    def mark_handled(self, path):
+        """Don't hand path out again unless it changes"""
+        signature, _ = self.settling.pop(path, (None, None))
+        if signature:
+            self.handled[path] = signature
+
+    def wait(self):
+        """Sleep until the next scan is due, or a watched directory changes"""
+        # Files still settling are looked at again as soon as they may be ready
+        timeout = self.settle_seconds if self.settling else self.scan_interval
+        if self.inotify:
+            self.inotify.read(timeout=int(timeout * 1000))
+        else:
+            time.sleep(timeout)
@@ -122,34 +122,45 @@ app_license = "mit"
 # ---------------
 # Hook on document methods and events
 
-# doc_events = {
-# 	"*": {
-# 		"on_update": "method",
-# 		"on_cancel": "method",
-# 		"on_trash": "method"
-# 	}
-# }
+doc_events = {
+	"Item": {
+		"on_update": "invoice_ocr.catalog.on_item_change",
+		"after_rename": "invoice_ocr.catalog.on_item_change",
+		"on_trash": "invoice_ocr.catalog.on_item_change",
+	},
+	"Customer": {
+		"on_update": "invoice_ocr.catalog.on_party_change",
+		"after_rename": "invoice_ocr.catalog.on_party_change",
+		"on_trash": "invoice_ocr.catalog.on_party_change",
+	},
+	"Supplier": {
+		"on_update": "invoice_ocr.catalog.on_party_change",
+		"after_rename": "invoice_ocr.catalog.on_party_change",
+		"on_trash": "invoice_ocr.catalog.on_party_change",
+	},
+	"Company": {
+		"on_update": "invoice_ocr.catalog.on_account_change",
+		"on_trash": "invoice_ocr.catalog.on_account_change",
+	},
+	"Account": {
+		"on_update": "invoice_ocr.catalog.on_account_change",
+		"after_rename": "invoice_ocr.catalog.on_account_change",
+		"on_trash": "invoice_ocr.catalog.on_account_change",
+	},
+}
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"invoice_ocr.tasks.all"
-# 	],
-# 	"daily": [
-# 		"invoice_ocr.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"invoice_ocr.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"invoice_ocr.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"invoice_ocr.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"cron": {
+		# Picks up queued extractions a finished or lost job did not dispatch.
+		# Every minute: "all" only runs on the scheduler tick, every 4 minutes by default
+		"* * * * *": [
+			"invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.dispatch_extractions"
+		],
+	},
+}
 
 # Testing
 # -------
@@ -177,7 +188,8 @@ app_license = "mit"
 # Ignore links to specified DocTypes when deleting documents
 # -----------------------------------------------------------
 
-# ignore_links_on_delete = ["Communication", "ToDo"]
+# Extraction logs are history for the performance report and outlive their uploads
+ignore_links_on_delete = ["OCR Extraction Log"]
 
 # Request Events
 # ----------------
@@ -227,3 +239,10 @@ app_license = "mit"
 # 	"Logging DocType Name": 30  # days to retain logs
 # }
 
+
+# Log Clearing
+# ------------
+
+default_log_clearing_doctypes = {
+	"OCR Extraction Log": 90,
+}
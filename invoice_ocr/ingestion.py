@@ -0,0 +1,193 @@
+"""Ingestion of scanned invoices from watched directories.
+
+    bench --site mysite watch-invoice-folders
+
+The directories come from site config:
+
+    "invoice_ocr_watch_folders": [
+        {"path": "/srv/scans/suppliers", "party_type": "Supplier", "archive_path": "/srv/scans/done"}
+    ]
+
+Files that have settled (see folder_watch) are gathered into Invoice Upload
+Batches, which create the uploads and queue their extraction as Bulk jobs.
+Content already attached to an upload or a batch is skipped. While the OCR
+backlog is at invoice_ocr_watch_max_backlog files, new files stay where they
+are until it drains.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+
+import frappe
+from frappe.query_builder.functions import Count
+from frappe.utils import add_to_date, cint, now_datetime
+
+from invoice_ocr.folder_watch import FolderWatcher
+from invoice_ocr.invoice_ocr.doctype.invoice_upload_batch.invoice_upload_batch import (
+    BATCH_TIMEOUT,
+    SUPPORTED_EXTENSIONS,
+)
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_BACKLOG = 200
+ATTACHED_TO = ("Invoice Upload", "Invoice Upload Batch")
+
+
+def get_watch_folders():
+    """The watched directories of the site, keyed by absolute path"""
+    folders = {}
+    for folder in frappe.conf.get("invoice_ocr_watch_folders") or []:
+        path = os.path.abspath(folder["path"])
+        if not os.path.isdir(path):
+            frappe.throw(f"Watched folder {path} does not exist.")
+        folders[path] = frappe._dict(folder, path=path, party_type=folder.get("party_type") or "Supplier")
+    return folders
+
+
+def get_ocr_backlog():
+    """Files waiting for OCR: queued uploads and the files of batches not yet turned into uploads"""
+    batch = frappe.qb.DocType("Invoice Upload Batch")
+    row = frappe.qb.DocType("Invoice Upload Batch File")
+    # A batch still Queued after its job's timeout was lost with its worker and holds no work
+    unprocessed = (
+        frappe.qb.from_(row)
+        .join(batch).on(row.parent == batch.name)
+        .where(batch.status == "Queued")
+        .where(batch.modified > add_to_date(now_datetime(), seconds=-BATCH_TIMEOUT))
+        .select(Count(row.name))
+    ).run()[0][0]
+    return frappe.db.count("Invoice Upload", {"ocr_status": "Queued"}) + unprocessed
+
+
+def is_known(content_hash):
+    return frappe.db.exists("File", {"content_hash": content_hash, "attached_to_doctype": ["in", ATTACHED_TO]})
+
+
+def ingest(folder, paths):
+    """Start an Invoice Upload Batch for the files at paths not seen before, returning its name"""
+    rows = []
+    file_names = []
+    hashes = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        # The same hash File keeps in content_hash
+        content_hash = hashlib.md5(content).hexdigest()
+        if content_hash in hashes or is_known(content_hash):
+            continue
+        hashes.add(content_hash)
+
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": os.path.basename(path),
+            "is_private": 1,
+            "content": content
+        }).insert(ignore_permissions=True)
+        file_names.append(file_doc.name)
+        rows.append({"file": file_doc.file_url, "source_path": path})
+
+    if not rows:
+        return None
+
+    batch = frappe.get_doc({
+        "doctype": "Invoice Upload Batch",
+        "party_type": folder.party_type,
+        "files": rows
+    }).insert(ignore_permissions=True)
+    for name in file_names:
+        frappe.db.set_value("File", name, {"attached_to_doctype": batch.doctype, "attached_to_name": batch.name})
+    batch.start()
+    return batch.name
+
+
+def get_archive_path(archive_path, path):
+    """Where path goes in the archive, numbered when a file of its name is there already"""
+    # Scanners restart their numbering (scan0001.pdf) every day or on every device
+    name, extension = os.path.splitext(os.path.basename(path))
+    target = os.path.join(archive_path, name + extension)
+    counter = 1
+    while os.path.exists(target):
+        target = os.path.join(archive_path, f"{name}-{counter}{extension}")
+        counter += 1
+    return target
+
+
+def archive(folder, path):
+    if not folder.get("archive_path"):
+        return
+    try:
+        os.makedirs(folder.archive_path, exist_ok=True)
+        shutil.move(path, get_archive_path(folder.archive_path, path))
+    except OSError:
+        # The file stays put; it was ingested and is skipped by its content hash from now on
+        frappe.log_error(frappe.get_traceback(), "Folder Archive Error")
+        frappe.db.commit()
+
+
+def ingest_ready(folders, watcher, paths):
+    """Ingest settled files as far as the backlog allows; False when it is full"""
+    room = (cint(frappe.conf.get("invoice_ocr_watch_max_backlog")) or DEFAULT_MAX_BACKLOG) - get_ocr_backlog()
+    if room <= 0:
+        return False
+
+    batch_size = cint(frappe.conf.get("invoice_ocr_watch_batch_size")) or DEFAULT_BATCH_SIZE
+    paths = paths[:room]
+    for folder_path, folder in folders.items():
+        folder_paths = [path for path in paths if os.path.dirname(path) == folder_path]
+        for start in range(0, len(folder_paths), batch_size):
+            chunk = folder_paths[start:start + batch_size]
+            try:
+                batch = ingest(folder, chunk)
+                frappe.db.commit()
+            except Exception:
+                frappe.db.rollback()
+                # Retried when the files change or the watcher restarts
+                frappe.log_error(frappe.get_traceback(), "Folder Ingestion Error")
+                batch = None
+            else:
+                for path in chunk:
+                    archive(folder, path)
+            for path in chunk:
+                watcher.mark_handled(path)
+            if batch:
+                frappe.logger("invoice_ocr").info(f"Ingested {len(chunk)} files from {folder_path} as {batch}")
+    return True
+
+
+def connect(site):
+    frappe.init(site=site)
+    frappe.connect()
+
+
+def watch(site):
+    """Ingest files from the site's watched folders until interrupted"""
+    connect(site)
+    try:
+        folders = get_watch_folders()
+        if not folders:
+            frappe.throw("No folders in the invoice_ocr_watch_folders site config.")
+        watcher = FolderWatcher(
+            folders,
+            SUPPORTED_EXTENSIONS,
+            settle_seconds=cint(frappe.conf.get("invoice_ocr_watch_settle_seconds")) or 5,
+            scan_interval=cint(frappe.conf.get("invoice_ocr_watch_scan_interval")) or 30,
+        )
+    finally:
+        frappe.destroy()
+
+    while True:
+        paths = watcher.scan()
+        if paths:
+            # A connection per round, so an idle night doesn't outlive the database's wait_timeout
+            connect(site)
+            try:
+                ingested = ingest_ready(folders, watcher, paths)
+            finally:
+                frappe.destroy()
+            if not ingested:
+                # Back-pressure: leave the files until the OCR workers catch up
+                time.sleep(watcher.scan_interval)
+                continue
+        watcher.wait()
@@ -16,17 +16,52 @@ frappe.ui.form.on('Invoice Upload', {
 });
 
 frappe.ui.form.on("Invoice Upload", {
+  setup(frm) {
+    // Extraction runs in a background job; reload when the worker reports back
+    frappe.realtime.on("invoice_ocr_extraction", function (data) {
+      if (!data || data.docname !== frm.doc.name) return;
+      if (data.status === "Extracted") {
+        frappe.show_alert({ message: __("OCR Extraction completed. Please review data before submitting."), indicator: "green" });
+      } else {
+        frappe.show_alert({ message: __("OCR Extraction failed: {0}", [data.message || ""]), indicator: "red" });
+      }
+      frm.reload_doc();
+    });
+  },
+
   refresh(frm) {
-    if (!frm.is_new() && frm.doc.ocr_status !== "Extracted") {
+    if (frm.doc.ocr_status === "Queued") {
+      frm.dashboard.set_headline(__("Waiting for a free OCR worker."));
+    } else if (frm.doc.ocr_status === "Processing") {
+      frm.dashboard.set_headline(__("OCR extraction is running in the background."));
+    }
+    if (!frm.is_new() && !["Extracted", "Queued", "Processing"].includes(frm.doc.ocr_status)) {
       frm.add_custom_button("Extract from File", function () {
         frappe.call({
         method: "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.extract_invoice",
         args: { docname: frm.doc.name },
-        callback: function () {
+        callback: function (r) {
+            if (r.message && r.message.status === "error") {
+              frappe.msgprint(r.message.message);
+            }
             frm.reload_doc();
         }
         });
       });
     }
+    if (frm.doc.duplicate_of) {
+      frm.set_intro(__("This looks like a rescan of {0}.", [frm.doc.duplicate_of.bold()]), "orange");
+      if (!["Extracted", "Queued", "Processing"].includes(frm.doc.ocr_status)) {
+        frm.add_custom_button(__("Reuse Extraction of {0}", [frm.doc.duplicate_of]), function () {
+          frappe.call({
+            method: "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.reuse_extraction",
+            args: { docname: frm.doc.name },
+            callback: function () {
+              frm.reload_doc();
+            },
+          });
+        });
+      }
+    }
   }
-});
\ No newline at end of file
+});
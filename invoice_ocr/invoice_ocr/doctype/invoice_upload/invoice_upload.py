@@ -1,17 +1,54 @@
-import cv2
-import pytesseract
-import numpy as np
+import os
 import frappe
 import json
 import re
 import traceback
-import difflib
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
 from frappe.utils.file_manager import get_file_path
 from frappe.model.document import Document
-from PIL import Image
-from frappe.utils import add_days, get_url_to_form, nowdate
+from frappe.utils import (
+    add_days,
+    add_to_date,
+    cint,
+    get_url_to_form,
+    now_datetime,
+    nowdate,
+    time_diff_in_seconds,
+)
+from invoice_ocr import scheduling
+from invoice_ocr.catalog import get_default_account, get_item_index, get_party_index, normalize_tax_id
+from invoice_ocr.invoice_ocr.doctype.ocr_extraction_template.ocr_extraction_template import get_template
+from invoice_ocr.invoice_ocr.doctype.ocr_fingerprint.ocr_fingerprint import find_duplicates, update_fingerprint
+from invoice_ocr.invoice_ocr.doctype.ocr_party_profile.ocr_party_profile import (
+    get_party_language,
+    record_page_languages,
+)
+from invoice_ocr.metrics import StageTimer, record_extraction, summarize_pages
+# The OCR stack (OpenCV, numpy, Tesseract, poppler) is imported inside the functions
+# that run it, so web workers that only list and save uploads never load it
+from invoice_ocr.ocr import cache as ocr_cache
+
+TABLE_HEADERS = ("QUANTITY", "UNIT PRICE", "AMOUNT")
+ITEM_FIELDS = ("ocr_description", "item", "qty", "rate", "ocr_confidence")
+OCR_TEXT_SUFFIX = "-ocr.txt"
+# Uploads turned into invoices per commit by the bulk job
+INVOICE_CHUNK_SIZE = 50
+
+# Patterns of the generic extractors, compiled once per process
+QTY_PATTERN = re.compile(r'(\d+\.\d{3})')
+RATE_PATTERN = re.compile(r'(\d+\.\d{2,3})')
+TABLE_ROW_PATTERN = re.compile(
+    r'^(.+?)\s+(\d{1,3}(?:,\d{3})*\.\d{3})\s*(kg|Units)?\s+(\d{1,3}(?:,\d{3})*\.\d{2,3})\s+.*?\d+\.\d{2}',
+    re.IGNORECASE
+)
+CHARGES_TABLE_PATTERN = re.compile(r'Custom Duties(.+?)Service Charges', re.DOTALL)
+CHARGE_PATTERN = re.compile(r'(\w[\w\s\/-]+)\s+(\d{1,3}(?:,\d{3})*)\s+(\d{1,3}(?:,\d{3})*)')
+PARTNER_NAME_PATTERN = re.compile(r'Partner\s*Name\s*:\s*([^\n]+)', re.IGNORECASE)
+NAME_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b')
+PARTY_LABEL_PATTERNS = [
+    re.compile(fr'{label}\s*:\s*([^\n]+)', re.IGNORECASE)
+    for label in ["Customer", "Client", "Supplier", "Vendor", "Bill To", "Sold To"]
+]
+INVOICE_TITLE_PATTERN = re.compile(r'Invoice\s+\w+/\d+/\d+', re.IGNORECASE)
 
 
 class InvoiceUpload(Document):
@@ -34,73 +71,65 @@ class InvoiceUpload(Document):
         if self.docstatus == 1:
             self.flags.read_only = True
 
-    def extract_invoice(self):
+    def on_trash(self):
+        frappe.db.delete("OCR Fingerprint", {"invoice_upload": self.name})
+
+    def extract_invoice(self, degraded=False):
         try:
             if not self.file:
                 frappe.throw("No file attached.")
 
+            # Picked up by run_extraction for the OCR Extraction Log
+            timer = StageTimer()
+            self.flags.extraction_metrics = metrics = {"timer": timer, "degraded": degraded}
+
             file_path = get_file_path(self.file)
-            text = ""
+            duplicate = self.check_duplicate(file_path)
+            if (
+                duplicate
+                and cint(frappe.conf.get("invoice_ocr_reuse_duplicates"))
+                and frappe.db.get_value("Invoice Upload", duplicate, "ocr_status") == "Extracted"
+            ):
+                metrics["reused_from"] = duplicate
+                return self.reuse_extraction(duplicate)
 
-            # Enhanced Odoo-style preprocessing
-            def preprocess_image(pil_img):
-                try:
-                    img = np.array(pil_img.convert("RGB"))
-                    channels = img.shape[-1] if img.ndim == 3 else 1
-                    
-                    if channels == 3:
-                        # Convert to grayscale
-                        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-                    else:
-                        gray = img
-                        
-                    # Enhance resolution (Odoo style)
-                    scaled = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-                    
-                    # Apply CLAHE for contrast enhancement (Odoo style)
-                    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-                    enhanced = clahe.apply(scaled)
-                    
-                    # Apply adaptive thresholding
-                    thresh = cv2.adaptiveThreshold(
-                        enhanced, 255,
-                        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                        cv2.THRESH_BINARY, 15, 10
-                    )
-                    
-                    # Apply erosion to reduce noise (Odoo style)
-                    kernel = np.ones((3, 3), np.uint8)
-                    processed = cv2.erode(thresh, kernel, iterations=1)
-                    
-                    return processed
-                except Exception as e:
-                    frappe.log_error(f"Image processing failed: {str(e)}", "OCR Error")
-                    return pil_img  # Return original if processing fails
-
-            if file_path.endswith(".pdf"):
-                images = convert_from_path(file_path, dpi=300)
-                for img in images:
-                    processed = preprocess_image(img)
-                    text += pytesseract.image_to_string(processed, config="--psm 4 --oem 3 -l eng+urd")
-            else:
-                img = Image.open(file_path)
-                processed = preprocess_image(img)
-                text = pytesseract.image_to_string(processed, config="--psm 4 --oem 3 -l eng+urd")
+            options = get_ocr_options(self.party_type, self.party, degraded=degraded)
+            pages = run_ocr(file_path, options)
+            text = get_page_text(pages)
+            words = get_page_words(pages)
+            timer.lap("ocr")
+
+            template, items, party_name = self.parse_document(text, words)
+            timer.lap("parse")
+
+            # Confident words or a plausible text layer can still miss the table or
+            # party; then the pages they came from are OCRed again at full resolution
+            if (not items or not (party_name or self.party)) and any(needs_rereading(page) for page in pages):
+                pages = reread_pages(file_path, options, pages)
+                text = get_page_text(pages)
+                words = get_page_words(pages)
+                timer.lap("ocr")
+
+                template, items, party_name = self.parse_document(text, words)
+                timer.lap("parse")
+            metrics["pages"] = summarize_pages(pages)
+
+            # Keep the text for debugging, outside the versioned document
+            save_ocr_text(self.name, text)
+            timer.lap("save")
 
-            # Save extracted text for debugging
-            self.raw_ocr_text = text[:10000]  # Save first 10k characters
-            self.save()
-            
-            items = self.extract_items(text)
             extracted_data = {
                 "items": items,
-                "party": None
+                "party": None,
+                "party_matched": False,
+                "template": template.name if template else None
             }
+            metrics["template"] = extracted_data["template"]
 
             # Get all items for matching
             all_items = self.get_items_for_matching()
             
-            self.set("invoice_upload_item", [])
+            rows = []
             seen_descriptions = set()  # Track seen descriptions to avoid duplicates
             
             for row in items:
@@ -125,11 +154,12 @@ class InvoiceUpload(Document):
                     bracket_match = self.fuzzy_match_item(bracket_text, all_items)
                     if bracket_match and bracket_match["score"] > 85:
                         matched_item = bracket_match["item_name"]
-                        self.append("invoice_upload_item", {
+                        rows.append({
                             "ocr_description": row["description"],
                             "qty": row["qty"],
                             "rate": row["rate"],
-                            "item": matched_item
+                            "item": matched_item,
+                            "ocr_confidence": row.get("confidence")
                         })
                         continue
                 
@@ -140,27 +170,39 @@ class InvoiceUpload(Document):
                 else:
                     matched_item = None
                     
-                self.append("invoice_upload_item", {
+                rows.append({
                     "ocr_description": row["description"],
                     "qty": row["qty"],
                     "rate": row["rate"],
-                    "item": matched_item
+                    "item": matched_item,
+                    "ocr_confidence": row.get("confidence")
                 })
 
-            # Extract party with fuzzy matching
-            party_name = self.extract_party(text)
+            timer.lap("item_match")
+
+            # Match the extracted party
+            matched_party = self.party
             if party_name:
                 party_match = self.fuzzy_match_party(party_name)
                 if party_match:
                     extracted_data["party"] = party_match["name"]
+                    extracted_data["party_matched"] = True
+                    matched_party = matched_party or party_match["name"]
                 else:
                     extracted_data["party"] = party_name
+            timer.lap("party_match")
+
+            # Learn the party's language from the pages whose script was detected
+            if options["lang"] == "auto":
+                record_page_languages(
+                    self.party_type,
+                    matched_party,
+                    [page["script"] for page in pages if page["source"] == "ocr" and page["script"]],
+                )
+
+            self.save_extraction(rows, extracted_data)
+            timer.lap("save")
 
-            self.extracted_data = json.dumps(extracted_data, indent=2)
-            self.ocr_status = "Extracted"
-            self.save()
-            frappe.msgprint("OCR Extraction completed. Please review data before submitting.")
-            
             return {
                 "status": "success",
                 "items": items,
@@ -171,12 +213,105 @@ class InvoiceUpload(Document):
             frappe.log_error(error_message, "OCR Extraction Failed")
             frappe.throw(f"Extraction failed: {str(e)}")
 
+    def parse_document(self, text, words):
+        """(template, items, party name) read from the OCR output"""
+        # A template for this party or layout replaces the generic extractors
+        template = get_template(self.party_type, self.party, text)
+        items = template.extract_items(text) if template else []
+        if not items:
+            template = None
+            items = self.extract_items(text, words)
+        party_name = (template and template.extract_party(text)) or self.extract_party(text)
+        return template, items, party_name
+
+    def check_duplicate(self, file_path):
+        """Flag the upload when its first page looks like an earlier upload's; returns that upload.
+
+        Later uploads fingerprinted first, as happens within a batch, are
+        flagged as duplicates of this one instead.
+        """
+        if not cint(frappe.conf.get("invoice_ocr_detect_duplicates", 1)):
+            return None
+
+        # One upload at a time, committed straight away, so extractions running
+        # side by side see each other's fingerprints
+        lock = frappe.cache().lock(frappe.cache().make_key("invoice_ocr:fingerprint"), timeout=60, blocking_timeout=30)
+        try:
+            if not lock.acquire():
+                raise frappe.ValidationError("Timed out waiting for the fingerprint lock")
+            try:
+                fingerprint, changed = update_fingerprint(self, file_path)
+                # Checked once per attachment, so a flag cleared by hand stays cleared
+                if not changed:
+                    return self.duplicate_of
+                duplicate, later = find_duplicates(self, fingerprint.phash, fingerprint.detail_hash)
+                self.db_set("duplicate_of", duplicate, update_modified=False)
+                for name in later:
+                    frappe.db.set_value("Invoice Upload", name, "duplicate_of", self.name, update_modified=False)
+                frappe.db.commit()
+            finally:
+                lock.release()
+        except Exception:
+            # Never worth failing the extraction over
+            frappe.log_error(frappe.get_traceback(), "OCR Fingerprint Error")
+            return None
+
+        return duplicate
+
+    def reuse_extraction(self, source_name):
+        """Copy another upload's extraction instead of running OCR"""
+        source = frappe.get_doc("Invoice Upload", source_name)
+        rows = [{field: row.get(field) for field in ITEM_FIELDS} for row in source.invoice_upload_item]
+        extracted_data = json.loads(source.extracted_data or "{}")
+        extracted_data["reused_from"] = source.name
+        self.save_extraction(rows, extracted_data)
+
+        return {
+            "status": "success",
+            "items": extracted_data.get("items", []),
+            "party": extracted_data.get("party"),
+            "reused_from": source.name
+        }
+
+    def save_extraction(self, rows, extracted_data):
+        """Write the extraction in one go: item rows bulk inserted, the upload
+        updated in place without re-validating or adding a version"""
+        frappe.db.delete("Invoice Upload Item", {
+            "parenttype": self.doctype,
+            "parent": self.name,
+            "parentfield": "invoice_upload_item"
+        })
+
+        if rows:
+            now = now_datetime()
+            user = frappe.session.user
+            frappe.db.bulk_insert(
+                "Invoice Upload Item",
+                ["name", "creation", "modified", "modified_by", "owner", "docstatus",
+                 "parent", "parenttype", "parentfield", "idx", *ITEM_FIELDS],
+                [
+                    (frappe.generate_hash(length=10), now, now, user, user, 0,
+                     self.name, self.doctype, "invoice_upload_item", idx, *(row.get(field) for field in ITEM_FIELDS))
+                    for idx, row in enumerate(rows, 1)
+                ],
+            )
+
+        self.db_set({
+            "extracted_data": json.dumps(extracted_data, indent=2),
+            "ocr_status": "Extracted"
+        })
+
     def ensure_party_exists(self):
         extracted = json.loads(self.extracted_data or '{}')
         party = extracted.get("party")
 
         if not party or not party.strip():
             frappe.throw("Party is missing. Cannot create invoice.")
+
+        # Extraction already matched it to an existing party
+        if extracted.get("party_matched"):
+            self.party = party
+            return
         
         # Check if party exists
         if frappe.db.exists(self.party_type, party):
@@ -198,6 +333,15 @@ class InvoiceUpload(Document):
         if self.invoice_created:
             frappe.throw("Invoice already created for this document")
             
+        # A rescan of an invoice that was already booked
+        if self.duplicate_of:
+            booked = frappe.db.get_value("Invoice Upload", self.duplicate_of, "invoice_reference")
+            if booked:
+                frappe.throw(
+                    f"This looks like a rescan of {self.duplicate_of}, already booked as {booked}. "
+                    "Clear Possible Duplicate Of if it is a different invoice."
+                )
+
         # Ensure party is set and exists
         self.ensure_party_exists()
 
@@ -219,6 +363,16 @@ class InvoiceUpload(Document):
             account = self.get_income_account()
             account_field = "income_account"
 
+        # Get the details of every matched item in one query
+        item_codes = list({row.item for row in self.invoice_upload_item if row.item})
+        item_details = {
+            item.name: item for item in frappe.get_all(
+                "Item",
+                filters={"name": ["in", item_codes]},
+                fields=["name", "item_name", "description", "stock_uom"]
+            )
+        } if item_codes else {}
+
         # Add items from the child table
         items_added = 0
         for row in self.invoice_upload_item:
@@ -228,17 +382,18 @@ class InvoiceUpload(Document):
                 continue
 
             try:
-                # Get item details
-                item_doc = frappe.get_doc("Item", item_code)
-                
+                item = item_details.get(item_code)
+                if not item:
+                    frappe.throw(f"Item {item_code} not found")
+
                 # Create item dictionary
                 item_dict = {
                     "item_code": item_code,
-                    "item_name": item_doc.item_name,
-                    "description": item_doc.description or row.ocr_description,
+                    "item_name": item.item_name,
+                    "description": item.description or row.ocr_description,
                     "qty": row.qty,
                     "rate": row.rate,
-                    "uom": item_doc.stock_uom or "Nos"
+                    "uom": item.stock_uom or "Nos"
                 }
                 
                 # Set account field based on invoice type
@@ -269,12 +424,15 @@ class InvoiceUpload(Document):
             inv.insert(ignore_permissions=True)
             status = "Draft"
         except Exception as e:
+            # Bulk creation rolls back to a savepoint, which would take this Error Log with it
+            if self.flags.raise_invoice_errors:
+                raise
             frappe.msgprint(f"Invoice creation failed: {str(e)}", alert=True, indicator="red")
             frappe.log_error(f"Invoice creation failed: {str(e)}", "Invoice Creation Error")
             return
         
         # Update status and reference
-        frappe.db.set_value(self.doctype, self.name, {
+        self.db_set({
             "invoice_created": 1,
             "invoice_reference": inv.name,
             "invoice_type": inv.doctype,
@@ -282,41 +440,36 @@ class InvoiceUpload(Document):
         })
 
         frappe.msgprint(f"<a href='{get_url_to_form(inv.doctype, inv.name)}'>{inv.name}</a> created ({status})")
+        return inv
 
     def get_expense_account(self):
         company = frappe.defaults.get_user_default("Company")
-        account = frappe.db.get_value("Company", company, "default_expense_account")
-        if not account:
-            account = frappe.db.get_value("Account", {
-                "account_type": "Expense",
-                "company": company,
-                "is_group": 0
-            }, "name")
+        account = get_default_account(company, "Expense")
         if not account:
             frappe.throw("No default Expense Account found for the company.")
         return account
 
     def get_income_account(self):
         company = frappe.defaults.get_user_default("Company")
-        account = frappe.db.get_value("Company", company, "default_income_account")
-        if not account:
-            account = frappe.db.get_value("Account", {
-                "account_type": "Income",
-                "company": company,
-                "is_group": 0
-            }, "name")
+        account = get_default_account(company, "Income")
         if not account:
             frappe.throw("No default Income Account found for the company.")
         return account
 
-    def extract_items(self, text):
+    def extract_items(self, text, words=None):
+        # Lay out the OCR words by position when we have them
+        if words is not None:
+            table_items = self.extract_table_items_from_words(words)
+            if table_items:
+                return table_items
+
         # First try to extract as structured table items
         table_items = self.extract_table_items(text)
         if table_items:
             return table_items
 
         # Then try to extract as bill of charges
-        charge_items = self.extract_charges(text)
+        charge_items = self.extract_charges(text, words)
         if charge_items:
             return charge_items
 
@@ -394,13 +547,13 @@ class InvoiceUpload(Document):
                     rate_str = parts[2].replace(',', '')
                     
                     # Extract quantity number
-                    qty_match = re.search(r'(\d+\.\d{3})', qty_str)
+                    qty_match = QTY_PATTERN.search(qty_str)
                     if not qty_match:
                         continue
                     qty = float(qty_match.group(1))
                     
                     # Extract rate number
-                    rate_match = re.search(r'(\d+\.\d{2,3})', rate_str)
+                    rate_match = RATE_PATTERN.search(rate_str)
                     if not rate_match:
                         continue
                     rate = float(rate_match.group(1))
@@ -424,14 +577,9 @@ class InvoiceUpload(Document):
         
         # If no pipe items found, try alternative table format
         if not items:
-            # Pattern to match table rows without pipes
-            pattern = re.compile(
-                r'^(.+?)\s+(\d{1,3}(?:,\d{3})*\.\d{3})\s*(kg|Units)?\s+(\d{1,3}(?:,\d{3})*\.\d{2,3})\s+.*?\d+\.\d{2}',
-                re.IGNORECASE
-            )
-            
+            # Match table rows without pipes
             for line in lines:
-                match = pattern.search(line)
+                match = TABLE_ROW_PATTERN.search(line)
                 if match:
                     try:
                         description = match.group(1).strip()
@@ -456,10 +604,52 @@ class InvoiceUpload(Document):
         
         return items
 
-    def extract_charges(self, text):
+    def extract_table_items_from_words(self, words):
+        """Extract items from the table under the QUANTITY / UNIT PRICE / AMOUNT header, by word position"""
+        table = words.read_table(TABLE_HEADERS)
+        if not table:
+            return []
+
+        (qty_column, rate_column, _), rows = table
+        items = []
+        previous_bottom = None
+        for cells, top, bottom in rows:
+            description_words = [index for cell in cells[:qty_column] for index in cell]
+            description = words.join(description_words)
+            if description.upper().startswith("TOTAL"):
+                break
+
+            qty_match = QTY_PATTERN.search(words.join(cells[qty_column]).replace(',', ''))
+            rate_match = RATE_PATTERN.search(words.join(cells[rate_column]).replace(',', ''))
+            if not qty_match or not rate_match:
+                # A description wrapped onto the next line belongs to the item above
+                line_height = bottom - top
+                if items and description and previous_bottom is not None and top - previous_bottom < line_height:
+                    items[-1]["description"] = f"{items[-1]['description']} {description}"
+                    previous_bottom = bottom
+                continue
+
+            # Clean up description
+            description = re.sub(r'\.{3,}', '', description)  # Remove ellipses
+            description = re.sub(r'^\W+|\W+$', '', description)  # Remove surrounding symbols
+            if len(description) < 3:
+                continue
+
+            items.append({
+                "description": description,
+                "qty": float(qty_match.group(1)),
+                "rate": float(rate_match.group(1)),
+                "confidence": words.mean_conf(description_words + list(cells[qty_column]) + list(cells[rate_column]))
+            })
+            previous_bottom = bottom
+
+        return items
+
+    def extract_charges(self, text, words=None):
         """Extract items from bill of charges format"""
         items = []
-        clean_text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
+        # The words are already split on whitespace
+        clean_text = words.join() if words is not None else re.sub(r'\s+', ' ', text)
         
         # Find the PARTICULARS section
         start = clean_text.find("PARTICULARS")
@@ -467,16 +657,14 @@ class InvoiceUpload(Document):
             return items
 
         # Extract table data
-        table_pattern = r'Custom Duties(.+?)Service Charges'
-        table_match = re.search(table_pattern, clean_text, re.DOTALL)
+        table_match = CHARGES_TABLE_PATTERN.search(clean_text)
         if not table_match:
             return items
             
         table_text = table_match.group(1)
         
         # Process each charge line
-        charge_pattern = r'(\w[\w\s\/-]+)\s+(\d{1,3}(?:,\d{3})*)\s+(\d{1,3}(?:,\d{3})*)'
-        for match in re.finditer(charge_pattern, table_text):
+        for match in CHARGE_PATTERN.finditer(table_text):
             try:
                 charge_name = match.group(1).strip()
                 consignee_amount = float(match.group(2).replace(',', ''))
@@ -498,7 +686,7 @@ class InvoiceUpload(Document):
     def extract_party(self, text):
         """Extract the actual partner name from the invoice"""
         # 1. First look for explicit "Partner Name" field
-        partner_match = re.search(r'Partner\s*Name\s*:\s*([^\n]+)', text, re.IGNORECASE)
+        partner_match = PARTNER_NAME_PATTERN.search(text)
         if partner_match:
             party = partner_match.group(1).strip()
             # Remove any trailing non-alphanumeric characters
@@ -511,16 +699,14 @@ class InvoiceUpload(Document):
         top_section = text.split("Invoice Date:")[0] if "Invoice Date:" in text else text[:500]
         
         # Find the longest word sequence that looks like a name
-        name_candidates = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b', top_section)
+        name_candidates = NAME_PATTERN.findall(top_section)
         if name_candidates:
             # Get the longest candidate as it's likely the partner name
             name_candidates.sort(key=len, reverse=True)
             return name_candidates[0]
 
         # 3. Look for other common labels
-        party_labels = ["Customer", "Client", "Supplier", "Vendor", "Bill To", "Sold To"]
-        for label in party_labels:
-            pattern = re.compile(fr'{label}\s*:\s*([^\n]+)', re.IGNORECASE)
+        for pattern in PARTY_LABEL_PATTERNS:
             match = pattern.search(text)
             if match:
                 party = match.group(1).strip()
@@ -529,7 +715,7 @@ class InvoiceUpload(Document):
                     return party
 
         # 4. Look for a name-like string near the invoice title
-        title_match = re.search(r'Invoice\s+\w+/\d+/\d+', text, re.IGNORECASE)
+        title_match = INVOICE_TITLE_PATTERN.search(text)
         if title_match:
             # Look before and after the title for a name
             start_pos = max(0, title_match.start() - 100)
@@ -537,7 +723,7 @@ class InvoiceUpload(Document):
             context = text[start_pos:end_pos]
             
             # Find the most prominent name in this context
-            name_candidates = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b', context)
+            name_candidates = NAME_PATTERN.findall(context)
             if name_candidates:
                 name_candidates.sort(key=len, reverse=True)
                 return name_candidates[0]
@@ -545,32 +731,8 @@ class InvoiceUpload(Document):
         return None
 
     def get_items_for_matching(self):
-        """Get all items with their names and codes for matching"""
-        # Get all active items
-        items = frappe.get_all("Item", 
-                              fields=["item_code", "item_name"],
-                              filters={"disabled": 0})
-        
-        # Create a list of all possible names and codes
-        item_data = []
-        for item in items:
-            # Add item code as primary identifier
-            if item.item_code:
-                item_data.append({
-                    "item_name": item.item_code,  # Actual item code
-                    "match_text": re.sub(r'[\[\]]', '', item.item_code.lower()),
-                    "type": "code"
-                })
-            
-            # Add item name as secondary identifier
-            if item.item_name and item.item_name.lower() != item.item_code.lower():
-                item_data.append({
-                    "item_name": item.item_code,  # Still use item code as identifier
-                    "match_text": re.sub(r'[\[\]]', '', item.item_name.lower()),
-                    "type": "name"
-                })
-        
-        return item_data
+        """Get the cached fuzzy index over all item names and codes"""
+        return get_item_index()
     
     def extract_bracket_text(self, description):
         """Extract text within square brackets"""
@@ -587,13 +749,8 @@ class InvoiceUpload(Document):
         best_match = None
         best_score = 0
         
-        for item in all_items:
-            # Clean match text similarly
-            clean_match = item["match_text"]
-            
-            # Calculate similarity score
-            score = difflib.SequenceMatcher(None, clean_text, clean_match).ratio() * 100
-            
+        # Only score the candidates the trigram index shortlists
+        for item, score in all_items.search(clean_text):
             # Give extra weight to code matches
             if item["type"] == "code":
                 score = min(score * 1.2, 100)  # Boost code matches by 20%
@@ -624,45 +781,383 @@ class InvoiceUpload(Document):
             return None
             
         clean_name = party_name.lower().strip()
-        party_type = self.party_type
-        
-        # Get all parties of the specified type
-        if party_type == "Customer":
-            parties = frappe.get_all("Customer", fields=["name", "customer_name"])
-            names = [p["customer_name"] for p in parties]
-        else:
-            parties = frappe.get_all("Supplier", fields=["name", "supplier_name"])
-            names = [p["supplier_name"] for p in parties]
-            
-        # Find best match
+        party_index = get_party_index(self.party_type if self.party_type == "Customer" else "Supplier")
+
+        # An exact tax ID identifies the party outright
+        tax_match = party_index.lookup(normalize_tax_id(clean_name))
+        if tax_match and tax_match["type"] == "tax_id":
+            return {
+                "name": tax_match["name"],
+                "score": 100,
+                "match_name": tax_match["match_name"]
+            }
+
+        # Find best match among the candidates the index shortlists
         best_match = None
         best_score = 0
         
-        for i, name in enumerate(names):
-            score = difflib.SequenceMatcher(None, clean_name, name.lower()).ratio() * 100
+        for party, score in party_index.search(clean_name):
+            if party["type"] == "tax_id":
+                continue
             if score > best_score:
                 best_score = score
                 best_match = {
-                    "name": parties[i]["name"],
+                    "name": party["name"],
                     "score": score,
-                    "match_name": name
+                    "match_name": party["match_name"]
                 }
         
         # Return match only if above confidence threshold
         return best_match if best_score > 80 else None
 
 
+OCR_QUEUE = "ocr"
+# OCR jobs of one site in the RQ queue at a time
+MAX_JOBS_IN_FLIGHT = 2
+DEGRADED_DPI = 200
+DEGRADED_LANG = "eng"
+FIRST_PASS_DPI = 150
+ESCALATE_BELOW_CONF = 80
+# Time a dispatched job has to show up in RQ before its upload counts as lost
+DISPATCH_GRACE_SECONDS = 60
+
+
+def get_ocr_queue():
+    """Return the dedicated OCR queue if the bench runs workers for it, else the long queue"""
+    from frappe.utils.background_jobs import get_queues_timeout
+
+    return OCR_QUEUE if OCR_QUEUE in get_queues_timeout() else "long"
+
+
+def get_ocr_workers():
+    """Number of processes used to OCR the pages of one document"""
+    return cint(frappe.conf.get("invoice_ocr_workers")) or os.cpu_count() or 1
+
+
+def get_ocr_options(party_type=None, party=None, degraded=False):
+    """OCR pipeline options, with the overrides set in site config.
+
+    Degraded options, used for bulk jobs while the OCR backlog is long, trade
+    accuracy for speed: a lower DPI and a single language.
+    """
+    from invoice_ocr.ocr import pipeline
+
+    options = pipeline.get_options(
+        use_text_layer=bool(cint(frappe.conf.get("invoice_ocr_use_text_layer", 1))),
+        backend=frappe.conf.get("invoice_ocr_backend") or "auto",
+        lang=frappe.conf.get("invoice_ocr_lang") or "auto",
+        layout=bool(cint(frappe.conf.get("invoice_ocr_layout", 1))),
+    )
+    options["preprocess"]["upscale_below_dpi"] = cint(frappe.conf.get("invoice_ocr_upscale_below_dpi")) or None
+    options["first_pass_dpi"] = cint(frappe.conf.get("invoice_ocr_first_pass_dpi", FIRST_PASS_DPI)) or None
+    options["escalate_below_conf"] = cint(frappe.conf.get("invoice_ocr_escalate_below_conf")) or ESCALATE_BELOW_CONF
+
+    if degraded:
+        options["dpi"] = cint(frappe.conf.get("invoice_ocr_degraded_dpi")) or DEGRADED_DPI
+        options["lang"] = frappe.conf.get("invoice_ocr_degraded_lang") or DEGRADED_LANG
+
+    # A party's learned language saves detecting the script of every page
+    if options["lang"] == "auto":
+        options["lang"] = get_party_language(party_type, party) or "auto"
+    return options
+
+
+def run_ocr(file_path, options=None, error_title="OCR Error", known_pages=None):
+    """OCR every page of a file, returning one dict per page (see pipeline).
+
+    Pages in known_pages (page number -> page) are taken as they are.
+    """
+    from invoice_ocr.ocr import pipeline
+
+    options = options or get_ocr_options()
+    cache_key = ocr_cache.get_cache_key(
+        ocr_cache.get_file_hash(file_path), pipeline.get_settings_fingerprint(options)
+    )
+    cached_pages, page_count = ocr_cache.get_pages(cache_key)
+    for page_no, page in (known_pages or {}).items():
+        cached_pages.setdefault(page_no, ocr_cache.to_entry(page))
+
+    if page_count and len(cached_pages) == page_count:
+        pages = [pipeline.make_cached_page(cached_pages[page_no]) for page_no in range(1, page_count + 1)]
+    else:
+        pages = pipeline.ocr_file(
+            file_path, options, workers=get_ocr_workers(), known_pages=cached_pages
+        )
+        # Pages that fell back to the unprocessed image are retried next time
+        ocr_cache.set_pages(
+            cache_key,
+            {page_no: page for page_no, page in enumerate(pages, 1) if not page["error"]},
+            len(pages),
+        )
+
+    for page in pages:
+        if page["error"]:
+            frappe.log_error(page["error"], error_title)
+
+    return pages
+
+
+def needs_rereading(page):
+    """Whether a page was taken from the first pass or the text layer, rather than full resolution OCR"""
+    from invoice_ocr.ocr.pipeline import is_text_layer_page
+
+    return page["first_pass"] or is_text_layer_page(page)
+
+
+def reread_pages(file_path, options, pages):
+    """OCR the pages the first pass or the text layer settled for again at full resolution, keeping the others"""
+    from invoice_ocr.ocr.pipeline import escalate
+
+    keep = {page_no: page for page_no, page in enumerate(pages, 1) if not needs_rereading(page)}
+    full_pages = run_ocr(file_path, dict(options, first_pass_dpi=None, use_text_layer=False), known_pages=keep)
+    return [
+        keep[page_no] if page_no in keep else escalate(first_page, full_page)
+        for page_no, (first_page, full_page) in enumerate(zip(pages, full_pages), 1)
+    ]
+
+
+def get_page_text(pages):
+    return "".join(page["text"] for page in pages)
+
+
+def save_ocr_text(docname, text):
+    """Attach the OCR text to the upload as a private file, replacing an earlier one"""
+    file_name = f"{docname}{OCR_TEXT_SUFFIX}"
+    for name in frappe.get_all("File", filters={
+        "attached_to_doctype": "Invoice Upload",
+        "attached_to_name": docname,
+        "file_name": file_name
+    }, pluck="name"):
+        frappe.delete_doc("File", name, ignore_permissions=True)
+
+    frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "attached_to_doctype": "Invoice Upload",
+        "attached_to_name": docname,
+        "is_private": 1,
+        "content": text
+    }).insert(ignore_permissions=True)
+
+
+def get_page_words(pages):
+    """The words of every page as one table, split from the text where no OCR words exist"""
+    from invoice_ocr.ocr.words import WordTable
+
+    return WordTable.concat([
+        (page["words"] if page["words"] is not None else WordTable.from_text(page["text"])).set_page(page_no)
+        for page_no, page in enumerate(pages, 1)
+    ])
+
+
+def enqueue_extraction(docname, priority="Interactive"):
+    """Put an Invoice Upload in the site's OCR queue; dispatch_extractions starts it when a slot is free"""
+    doc = frappe.get_doc("Invoice Upload", docname)
+    doc.db_set({
+        "ocr_status": "Queued",
+        "ocr_priority": priority,
+        "ocr_page_estimate": estimate_pages(doc.file),
+        "ocr_queued_at": now_datetime(),
+        "ocr_dispatched_at": None,
+        "ocr_degraded": 0
+    }, update_modified=False)
+
+    # One dispatch after the commit, however many uploads were queued
+    if not frappe.flags.invoice_ocr_dispatch_pending:
+        frappe.flags.invoice_ocr_dispatch_pending = True
+        frappe.db.after_commit.add(dispatch_extractions)
+
+
+def estimate_pages(file_url):
+    """Page count of an attached file, the cost estimate used to share the OCR workers"""
+    # Runs in the web request: ask poppler directly rather than loading the OCR pipeline
+    from pdf2image import pdfinfo_from_path
+
+    try:
+        file_path = get_file_path(file_url)
+        return pdfinfo_from_path(file_path)["Pages"] if file_path.lower().endswith(".pdf") else 1
+    except Exception:
+        return 1
+
+
+def get_job_timeout():
+    return cint(frappe.conf.get("invoice_ocr_job_timeout")) or 1800
+
+
+def get_extraction_job_id(docname):
+    return f"invoice_ocr::extract::{docname}"
+
+
+def is_lost(job, grace_before):
+    """Whether a Processing upload's job is no longer queued or running in RQ.
+
+    RQ ends jobs that outlive their timeout, and a worker killed mid-job (OOM,
+    restart) leaves the upload Processing with no job behind it.
+    """
+    from frappe.utils.background_jobs import is_job_enqueued
+
+    if not job.dispatched_at:
+        return True
+    return job.dispatched_at < grace_before and not is_job_enqueued(get_extraction_job_id(job.name))
+
+
+def fail_lost_extraction(docname):
+    """Mark an upload whose job was lost as Failed, freeing its slot"""
+    frappe.db.set_value("Invoice Upload", docname, "ocr_status", "Failed", update_modified=False)
+    frappe.db.commit()
+    frappe.log_error(f"The OCR job of {docname} was lost or timed out", "OCR Dispatch Error")
+    notify_extraction_done(docname, {"status": "Failed", "message": "The OCR job was lost or timed out"})
+
+
+def dispatch_extractions():
+    """Hand queued uploads to the OCR workers while the site has free slots"""
+    frappe.flags.invoice_ocr_dispatch_pending = False
+    lock = frappe.cache().lock(frappe.cache().make_key("invoice_ocr:dispatch"), timeout=60, blocking_timeout=10)
+    if not lock.acquire():
+        return
+
+    try:
+        jobs = frappe.get_all(
+            "Invoice Upload",
+            filters={"ocr_status": ["in", ["Queued", "Processing"]]},
+            fields=["name", "owner", "ocr_status", "ocr_priority as priority", "ocr_page_estimate as pages",
+                    "ocr_queued_at as queued_at", "ocr_dispatched_at as dispatched_at"],
+        )
+        # A lost job no longer holds a slot. Its upload is failed rather than
+        # queued again, so a file that kills workers can't loop
+        grace_before = add_to_date(now_datetime(), seconds=-DISPATCH_GRACE_SECONDS)
+        in_flight = []
+        for job in jobs:
+            if job.ocr_status != "Processing":
+                continue
+            if is_lost(job, grace_before):
+                fail_lost_extraction(job.name)
+            else:
+                in_flight.append(job)
+        queued = [job for job in jobs if job.ocr_status == "Queued"]
+        for job in jobs:
+            job.pages = job.pages or 1
+            job.queued_at = job.queued_at or grace_before
+
+        slots = (cint(frappe.conf.get("invoice_ocr_max_jobs_in_flight")) or MAX_JOBS_IN_FLIGHT) - len(in_flight)
+        if slots <= 0 or not queued:
+            return
+
+        backlog_pages = sum(job.pages for job in queued)
+        degraded_threshold = cint(frappe.conf.get("invoice_ocr_degraded_backlog_pages"))
+        for job in scheduling.plan_dispatch(queued, in_flight, slots):
+            degraded = scheduling.is_degraded(job, backlog_pages, degraded_threshold)
+            backlog_pages -= job.pages
+            frappe.db.set_value("Invoice Upload", job.name, {
+                "ocr_status": "Processing",
+                "ocr_dispatched_at": now_datetime(),
+                "ocr_degraded": int(degraded)
+            }, update_modified=False)
+            frappe.db.commit()
+
+            try:
+                frappe.enqueue(
+                    "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.run_extraction",
+                    queue=get_ocr_queue(),
+                    timeout=get_job_timeout(),
+                    job_id=get_extraction_job_id(job.name),
+                    deduplicate=True,
+                    # Interactive jobs overtake the other sites' bulk jobs too
+                    at_front=job.priority == "Interactive",
+                    docname=job.name,
+                    degraded=degraded,
+                )
+            except Exception:
+                # Back in line for the next dispatch
+                frappe.db.set_value("Invoice Upload", job.name, "ocr_status", "Queued", update_modified=False)
+                frappe.db.commit()
+                frappe.log_error(frappe.get_traceback(), "OCR Dispatch Error")
+                break
+    finally:
+        lock.release()
+
+
 @frappe.whitelist()
 def extract_invoice(docname):
+    """Queue OCR extraction for an Invoice Upload and return immediately"""
     try:
         doc = frappe.get_doc("Invoice Upload", docname)
-        result = doc.extract_invoice()
-        return result
+        doc.check_permission("write")
+        if not doc.file:
+            frappe.throw("No file attached.")
+
+        enqueue_extraction(docname)
+        return {"status": "queued"}
     except Exception as e:
         frappe.log_error(f"Extract invoice failed: {str(e)}", "Extract Invoice Error")
         return {"status": "error", "message": str(e)}
 
 
+@frappe.whitelist()
+def reuse_extraction(docname):
+    """Copy the extraction of the upload this one duplicates, instead of running OCR"""
+    doc = frappe.get_doc("Invoice Upload", docname)
+    doc.check_permission("write")
+    if not doc.duplicate_of:
+        frappe.throw("This upload is not marked as a duplicate.")
+    if doc.ocr_status in ("Queued", "Processing"):
+        frappe.throw("OCR extraction of this upload is already queued.")
+    if frappe.db.get_value("Invoice Upload", doc.duplicate_of, "ocr_status") != "Extracted":
+        frappe.throw(f"{doc.duplicate_of} has not been extracted yet.")
+
+    return doc.reuse_extraction(doc.duplicate_of)
+
+
+def run_extraction(docname, degraded=False):
+    """Background job: run OCR extraction and notify the form when done"""
+    doc = None
+    try:
+        doc = frappe.get_doc("Invoice Upload", docname)
+        if doc.ocr_queued_at:
+            doc.flags.queue_wait = time_diff_in_seconds(now_datetime(), doc.ocr_queued_at)
+        doc.extract_invoice(degraded=degraded)
+        frappe.db.commit()
+        result = {"status": "Extracted"}
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.db.set_value("Invoice Upload", docname, "ocr_status", "Failed", update_modified=False)
+        frappe.db.commit()
+        result = {"status": "Failed", "message": str(e)}
+
+    if doc:
+        # Metrics must never fail an extraction
+        try:
+            record_extraction(doc, result["status"], result.get("message"))
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), "OCR Metrics Error")
+
+    notify_extraction_done(docname, result)
+
+    # This job's slot is free again
+    dispatch_extractions()
+
+
+def notify_extraction_done(docname, result):
+    """Tell the form, and the upload's batch, that an extraction finished"""
+    frappe.publish_realtime(
+        "invoice_ocr_extraction",
+        dict(result, docname=docname),
+        doctype="Invoice Upload",
+        docname=docname,
+    )
+
+    batch = frappe.db.get_value("Invoice Upload", docname, "batch")
+    if batch:
+        from invoice_ocr.invoice_ocr.doctype.invoice_upload_batch.invoice_upload_batch import (
+            update_batch_progress,
+        )
+
+        update_batch_progress(batch)
+        frappe.db.commit()
+
+
 @frappe.whitelist()
 def create_invoice(docname, submit_invoice=False):
     """Create invoice from the Create Invoice button"""
@@ -681,48 +1176,138 @@ def create_invoice(docname, submit_invoice=False):
         return {"status": "error", "message": str(e)}
 
 
+@frappe.whitelist()
+def create_invoices(names=None, filters=None, submit_invoice=False):
+    """Queue invoice creation for many Extracted uploads, given by name or by list filters"""
+    frappe.has_permission("Invoice Upload", "write", throw=True)
+
+    if names:
+        names = frappe.parse_json(names)
+        # User permissions and permission queries can hide single uploads
+        for name in names:
+            frappe.has_permission("Invoice Upload", "write", name, throw=True)
+    else:
+        names = frappe.get_list(
+            "Invoice Upload",
+            filters=frappe.parse_json(filters) if filters else {},
+            pluck="name",
+            limit_page_length=0
+        )
+    if not names:
+        frappe.throw("No Invoice Uploads selected.")
+
+    # Only extracted uploads without an invoice are picked up
+    names = frappe.get_all("Invoice Upload", filters={
+        "name": ["in", names],
+        "ocr_status": "Extracted",
+        "invoice_created": 0,
+        "docstatus": ["<", 2]
+    }, pluck="name", order_by="creation asc")
+    if not names:
+        return {"status": "skipped", "count": 0}
+
+    frappe.enqueue(
+        "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.run_invoice_creation",
+        queue="long",
+        timeout=get_job_timeout(),
+        enqueue_after_commit=True,
+        names=names,
+        submit_invoice=submit_invoice,
+        user=frappe.session.user,
+    )
+    return {"status": "queued", "count": len(names)}
+
+
+def run_invoice_creation(names, submit_invoice=False, user=None):
+    """Background job: create the invoices of many uploads, committing chunk by chunk.
+
+    A failing upload is rolled back to its savepoint and reported; it does
+    not abort the others.
+    """
+    chunk_size = cint(frappe.conf.get("invoice_ocr_invoice_chunk_size")) or INVOICE_CHUNK_SIZE
+    created, errors = [], []
+
+    # The per-invoice messages are meant for the form, not for a batch
+    frappe.flags.mute_messages = True
+    try:
+        for start in range(0, len(names), chunk_size):
+            for name in names[start:start + chunk_size]:
+                frappe.db.savepoint("invoice_ocr_invoice")
+                try:
+                    doc = frappe.get_doc("Invoice Upload", name)
+                    doc.flags.raise_invoice_errors = True
+                    doc.create_invoice_from_child(submit_invoice=submit_invoice)
+                    created.append(name)
+                except Exception as e:
+                    frappe.db.rollback(save_point="invoice_ocr_invoice")
+                    errors.append({"name": name, "error": str(e)})
+
+            frappe.db.commit()
+            frappe.publish_realtime(
+                "invoice_ocr_invoice_creation",
+                {"done": min(start + chunk_size, len(names)), "total": len(names),
+                 "created": len(created), "failed": len(errors)},
+                user=user,
+            )
+    finally:
+        frappe.flags.mute_messages = False
+
+    if errors:
+        frappe.log_error(
+            "\n".join(f"{error['name']}: {error['error']}" for error in errors),
+            "Bulk Invoice Creation Errors"
+        )
+        frappe.db.commit()
+
+    frappe.publish_realtime(
+        "invoice_ocr_invoice_creation",
+        {"done": len(names), "total": len(names), "created": len(created), "failed": len(errors),
+         "errors": errors, "finished": True},
+        user=user,
+    )
+
+
 # Debug method to test OCR safely
 @frappe.whitelist()
 def debug_ocr_preview(docname):
+    """Queue an OCR preview of an upload; the text is published as invoice_ocr_preview when ready"""
     try:
         doc = frappe.get_doc("Invoice Upload", docname)
-        file_path = get_file_path(doc.file)
+        # The preview attaches its text to the upload
+        doc.check_permission("write")
+        if not doc.file:
+            frappe.throw("No file attached.")
 
-        def preprocess_image(pil_img):
-            try:
-                img = np.array(pil_img.convert("RGB"))
-                gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-                scaled = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-                enhanced = clahe.apply(scaled)
-                thresh = cv2.adaptiveThreshold(
-                    enhanced, 255,
-                    cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                    cv2.THRESH_BINARY, 15, 10
-                )
-                kernel = np.ones((3, 3), np.uint8)
-                processed = cv2.erode(thresh, kernel, iterations=1)
-                return processed
-            except Exception as e:
-                frappe.log_error(f"Debug image processing failed: {str(e)}", "OCR Debug Error")
-                return pil_img
-
-        text = ""
-        if file_path.endswith(".pdf"):
-            images = convert_from_path(file_path, dpi=300)
-            for img in images:
-                processed = preprocess_image(img)
-                text += pytesseract.image_to_string(processed, config="--psm 4 --oem 3 -l eng+urd")
-        else:
-            img = Image.open(file_path)
-            processed = preprocess_image(img)
-            text = pytesseract.image_to_string(processed, config="--psm 4 --oem 3 -l eng+urd")
+        frappe.enqueue(
+            "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.run_ocr_preview",
+            queue=get_ocr_queue(),
+            timeout=get_job_timeout(),
+            job_id=f"invoice_ocr::preview::{docname}",
+            deduplicate=True,
+            enqueue_after_commit=True,
+            docname=docname,
+            user=frappe.session.user,
+        )
+        return {"status": "queued"}
+    except Exception as e:
+        frappe.log_error(f"OCR debug failed: {str(e)}", "OCR Debug Error")
+        return {"status": "error", "message": str(e)}
 
-        # Save to document for debugging
-        doc.raw_ocr_text = text[:10000]
-        doc.save()
-        
-        return text[:5000]  # Limit output to first 5000 characters
+
+def run_ocr_preview(docname, user=None):
+    """Background job: OCR an upload, keep the text with it and send the start of it to the user"""
+    try:
+        doc = frappe.get_doc("Invoice Upload", docname)
+        text = get_page_text(run_ocr(get_file_path(doc.file), error_title="OCR Debug Error"))
+
+        # Save with the document for debugging
+        save_ocr_text(docname, text)
+        frappe.db.commit()
+        result = {"status": "success", "text": text[:5000]}  # Limit output to first 5000 characters
     except Exception as e:
+        frappe.db.rollback()
         frappe.log_error(f"OCR debug failed: {str(e)}", "OCR Debug Error")
-        return f"Error: {str(e)}"
+        frappe.db.commit()
+        result = {"status": "error", "message": str(e)}
+
+    frappe.publish_realtime("invoice_ocr_preview", dict(result, docname=docname), user=user)
@@ -0,0 +1,38 @@
+// Copyright (c) 2026, mohtashim and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Invoice Upload"] = {
+  onload(listview) {
+    // One background job for all selected uploads instead of a request per invoice
+    listview.page.add_action_item(__("Create Invoices"), function () {
+      const names = listview.get_checked_items(true);
+      frappe.call({
+        method: "invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload.create_invoices",
+        args: { names: names },
+        callback: function (r) {
+          if (!r.message) return;
+          if (r.message.status === "queued") {
+            frappe.show_alert({ message: __("Creating {0} invoices in the background", [r.message.count]), indicator: "blue" });
+          } else {
+            frappe.show_alert({ message: __("None of the selected uploads is ready for an invoice"), indicator: "orange" });
+          }
+        },
+      });
+    });
+
+    frappe.realtime.on("invoice_ocr_invoice_creation", function (data) {
+      if (!data.finished) {
+        frappe.show_progress(__("Creating Invoices"), data.done, data.total);
+        return;
+      }
+      frappe.hide_progress();
+      frappe.msgprint({
+        title: __("Invoices Created"),
+        message: __("{0} created, {1} failed", [data.created, data.failed]) +
+          (data.errors || []).map((e) => `<br>${e.name}: ${frappe.utils.escape_html(e.error)}`).join(""),
+        indicator: data.failed ? "orange" : "green",
+      });
+      listview.refresh();
+    });
+  },
+};
@@ -0,0 +1,28 @@
+// Copyright (c) 2026, mohtashim and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Invoice Upload Batch", {
+  setup(frm) {
+    frappe.realtime.on("invoice_ocr_batch_progress", function (data) {
+      if (!data || data.batch !== frm.doc.name) return;
+      frm.reload_doc();
+    });
+  },
+
+  refresh(frm) {
+    if (!frm.is_new() && ["Draft", "Failed"].includes(frm.doc.status)) {
+      frm.add_custom_button(frm.doc.status === "Failed" ? "Resume" : "Start Extraction", function () {
+        frm.call("start").then(() => frm.reload_doc());
+      });
+    }
+
+    if (frm.doc.total_files) {
+      const done = (frm.doc.extracted || 0) + (frm.doc.failed || 0);
+      frm.dashboard.show_progress(
+        __("Extraction"),
+        (done / frm.doc.total_files) * 100,
+        __("{0} of {1} processed, {2} failed", [done, frm.doc.total_files, frm.doc.failed || 0])
+      );
+    }
+  }
+});
@@ -0,0 +1,145 @@
+# Copyright (c) 2026, mohtashim and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now_datetime, time_diff_in_seconds
+from invoice_ocr.invoice_ocr.doctype.invoice_upload.invoice_upload import enqueue_extraction
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")
+# Timeout of the process_batch job, in seconds
+BATCH_TIMEOUT = 3600
+
+
+class InvoiceUploadBatch(Document):
+    def validate(self):
+        if not self.files and not self.zip_file:
+            frappe.throw("Attach a ZIP archive or add files to the batch.")
+
+    @frappe.whitelist()
+    def start(self):
+        """Queue creation of the Invoice Uploads and their extraction, or resume a failed batch"""
+        if self.status not in ("Draft", "Failed"):
+            frappe.throw(f"Batch {self.name} has already been started.")
+
+        self.db_set("status", "Queued")
+        frappe.enqueue(
+            "invoice_ocr.invoice_ocr.doctype.invoice_upload_batch.invoice_upload_batch.process_batch",
+            queue="long",
+            timeout=BATCH_TIMEOUT,
+            enqueue_after_commit=True,
+            batch=self.name,
+        )
+
+    def unzip_files(self):
+        """Move the files of the attached ZIP archive into the files table"""
+        file_doc = frappe.get_doc("File", {"file_url": self.zip_file})
+        # File.unzip deletes the archive once its members are saved as files
+        for member in file_doc.unzip():
+            if member.file_url.lower().endswith(SUPPORTED_EXTENSIONS):
+                self.append("files", {"file": member.file_url})
+        self.zip_file = None
+
+
+def process_batch(batch):
+    """Background job: create one Invoice Upload per file and fan extraction out to the OCR queue.
+
+    Progress is committed file by file, so starting a Failed batch again
+    picks up where it stopped.
+    """
+    doc = frappe.get_doc("Invoice Upload Batch", batch)
+    try:
+        create_uploads(doc)
+    except Exception:
+        frappe.db.rollback()
+        frappe.db.set_value("Invoice Upload Batch", batch, "status", "Failed", update_modified=False)
+        frappe.db.commit()
+        frappe.log_error(frappe.get_traceback(), "Invoice Upload Batch Error")
+        return
+
+    update_batch_progress(doc.name)
+
+
+def create_uploads(doc):
+    if doc.zip_file:
+        # The archive is gone once unzipped, so its files are kept right away
+        doc.unzip_files()
+        doc.save()
+        frappe.db.commit()
+
+    for row in doc.files:
+        if row.invoice_upload:
+            continue
+
+        upload = frappe.get_doc({
+            "doctype": "Invoice Upload",
+            "party_type": doc.party_type,
+            "file": row.file,
+            "batch": doc.name
+        })
+        upload.insert()
+        row.db_set("invoice_upload", upload.name, update_modified=False)
+        frappe.db.commit()
+
+    doc.total_files = len(doc.files)
+    doc.status = "In Progress"
+    doc.started_at = doc.started_at or now_datetime()
+    doc.save()
+
+    # Uploads queued before a failure are left alone; jobs are pushed once committed
+    pending = frappe.get_all("Invoice Upload", filters={"batch": doc.name, "ocr_status": "Pending"}, pluck="name")
+    for upload in pending:
+        enqueue_extraction(upload, priority="Bulk")
+    frappe.db.commit()
+
+
+def update_batch_progress(batch):
+    """Recount the extraction status of a batch's uploads and publish it"""
+    counts = {
+        row.ocr_status: row.count
+        for row in frappe.get_all(
+            "Invoice Upload",
+            filters={"batch": batch},
+            fields=["ocr_status", "count(name) as count"],
+            group_by="ocr_status",
+        )
+    }
+
+    values = {
+        "pending": counts.get("Pending", 0) + counts.get("Queued", 0),
+        "processing": counts.get("Processing", 0),
+        "extracted": counts.get("Extracted", 0),
+        "failed": counts.get("Failed", 0),
+    }
+
+    total, started_at = frappe.db.get_value("Invoice Upload Batch", batch, ["total_files", "started_at"])
+    done = values["extracted"] + values["failed"]
+    if started_at:
+        minutes = time_diff_in_seconds(now_datetime(), started_at) / 60
+        values["throughput"] = done / minutes if minutes else 0
+
+    if total and done >= total:
+        values["status"] = "Completed with Errors" if values["failed"] else "Completed"
+        values["completed_at"] = now_datetime()
+
+    frappe.db.set_value("Invoice Upload Batch", batch, values, update_modified=False)
+    frappe.publish_realtime(
+        "invoice_ocr_batch_progress",
+        dict(values, batch=batch, total_files=total),
+        doctype="Invoice Upload Batch",
+        docname=batch,
+    )
+
+
+@frappe.whitelist()
+def create_batch(party_type, file_urls):
+    """Create and start a batch from files already uploaded through upload_file"""
+    file_urls = frappe.parse_json(file_urls)
+    batch = frappe.get_doc({
+        "doctype": "Invoice Upload Batch",
+        "party_type": party_type,
+        "files": [{"file": file_url} for file_url in file_urls]
+    })
+    batch.insert()
+    batch.start()
+    return {"name": batch.name, "total_files": len(file_urls)}
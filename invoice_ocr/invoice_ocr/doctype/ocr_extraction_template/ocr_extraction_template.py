@@ -0,0 +1,60 @@
+# Copyright (c) 2026, mohtashim and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from invoice_ocr.catalog import get_index, invalidate_index
+from invoice_ocr.extraction_templates import ExtractionTemplate, find_template
+
+TEMPLATE_FIELDS = [
+    "name", "row_pattern", "fingerprint", "table_start", "table_end",
+    "party_pattern", "party_type", "party", "priority",
+]
+INDEX_NAME = "extraction_templates"
+
+
+class OCRExtractionTemplate(Document):
+    def validate(self):
+        if self.party and not self.party_type:
+            frappe.throw("Set the Party Type of the party.")
+        if not self.party and not (self.fingerprint or "").strip():
+            frappe.throw("Set a Party or a Header Fingerprint, otherwise the template is never used.")
+
+        try:
+            ExtractionTemplate(**{field: self.get(field) for field in TEMPLATE_FIELDS})
+        except ValueError as e:
+            frappe.throw(str(e))
+
+    def on_update(self):
+        invalidate_index(INDEX_NAME)
+
+    def after_rename(self, *args):
+        invalidate_index(INDEX_NAME)
+
+    def on_trash(self):
+        invalidate_index(INDEX_NAME)
+
+
+def compile_templates(rows):
+    templates = []
+    for row in rows:
+        try:
+            templates.append(ExtractionTemplate(**row))
+        except ValueError as e:
+            frappe.log_error(f"OCR Extraction Template {row['name']}: {str(e)}", "OCR Template Error")
+    return templates
+
+
+def get_templates():
+    """Compiled enabled templates, cached until one of them changes"""
+    return get_index(
+        INDEX_NAME,
+        lambda: frappe.get_all("OCR Extraction Template", filters={"enabled": 1}, fields=TEMPLATE_FIELDS),
+        factory=compile_templates,
+    )
+
+
+def get_template(party_type, party, text):
+    """The template to extract a document with, None to use the generic extractors"""
+    templates = get_templates()
+    return find_template(templates, party_type, party, text) if templates else None
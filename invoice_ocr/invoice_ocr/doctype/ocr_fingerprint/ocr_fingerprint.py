@@ -0,0 +1,72 @@
+# Copyright (c) 2026, mohtashim and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint
+
+# Bits of the 256 bit detail hash two scans of one invoice may differ by
+DEFAULT_MAX_DISTANCE = 24
+
+
+class OCRFingerprint(Document):
+    pass
+
+
+def update_fingerprint(upload, file_path):
+    """Fingerprint an upload's first page; returns (fingerprint, whether it was computed anew)"""
+    existing = frappe.db.get_value(
+        "OCR Fingerprint", upload.name, ["name", "file", "phash", "detail_hash"], as_dict=True
+    )
+    if existing and existing.file == upload.file:
+        return existing, False
+
+    from invoice_ocr.ocr import fingerprint
+
+    phash, detail_hash = fingerprint.fingerprint_file(file_path)
+    if existing:
+        frappe.delete_doc("OCR Fingerprint", existing.name, ignore_permissions=True)
+    doc = frappe.get_doc({
+        "doctype": "OCR Fingerprint",
+        "invoice_upload": upload.name,
+        "party_type": upload.party_type,
+        "file": upload.file,
+        "phash": phash,
+        "detail_hash": detail_hash,
+        **{f"band_{band}": value for band, value in enumerate(fingerprint.get_bands(phash))},
+    }).insert(ignore_permissions=True)
+    return doc, True
+
+
+def find_duplicates(upload, phash, detail_hash):
+    """Uploads whose first page looks like this one: (the closest earlier one or None, later unflagged ones)"""
+    from invoice_ocr.ocr import fingerprint
+
+    candidates = frappe.get_all(
+        "OCR Fingerprint",
+        filters={"party_type": upload.party_type, "invoice_upload": ["!=", upload.name]},
+        or_filters={f"band_{band}": value for band, value in enumerate(fingerprint.get_bands(phash))},
+        fields=["invoice_upload", "phash", "detail_hash"],
+    )
+    max_distance = cint(frappe.conf.get("invoice_ocr_duplicate_distance")) or DEFAULT_MAX_DISTANCE
+    distances = {
+        candidate.invoice_upload: fingerprint.distance(detail_hash, candidate.detail_hash)
+        for candidate in candidates
+        # The bands only promise candidates within BANDS - 1 bits
+        if fingerprint.distance(phash, candidate.phash) < fingerprint.BANDS
+    }
+    distances = {name: distance for name, distance in distances.items() if distance <= max_distance}
+    if not distances:
+        return None, []
+
+    earlier, later = [], []
+    for row in frappe.get_all(
+        "Invoice Upload",
+        filters={"name": ["in", list(distances)]},
+        fields=["name", "creation", "duplicate_of"],
+    ):
+        if row.creation < upload.creation:
+            earlier.append(row.name)
+        elif not row.duplicate_of:
+            later.append(row.name)
+    return (min(earlier, key=lambda name: distances[name]) if earlier else None), later
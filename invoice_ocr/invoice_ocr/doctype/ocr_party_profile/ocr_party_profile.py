@@ -0,0 +1,59 @@
+# Copyright (c) 2026, mohtashim and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+# English-only pages seen before a party's invoices are OCRed with eng alone
+MIN_PAGES_TO_LEARN = 3
+
+
+class OCRPartyProfile(Document):
+    def learn_language(self):
+        """Set the language from the detected page counts unless it is fixed"""
+        if self.language_fixed:
+            return
+        if self.urd_pages:
+            self.language = "eng+urd"
+        elif self.eng_pages >= MIN_PAGES_TO_LEARN:
+            self.language = "eng"
+
+
+def get_party_language(party_type, party):
+    """Learned or configured OCR language of a party, None to detect per page"""
+    if not party:
+        return None
+    return frappe.db.get_value("OCR Party Profile", {"party_type": party_type, "party": party}, "language") or None
+
+
+def record_page_languages(party_type, party, scripts):
+    """Count the scripts confidently detected on a party's pages and update its default.
+
+    Best effort: a failure is logged and never fails the extraction.
+    """
+    if not party or not scripts or not frappe.db.exists(party_type, party):
+        return
+
+    frappe.db.savepoint("invoice_ocr_party_profile")
+    try:
+        update_page_counts(party_type, party, scripts)
+    except Exception:
+        # Concurrent extractions of one party race to create or save its profile
+        # (DuplicateEntryError, TimestampMismatchError); the next invoice counts again
+        frappe.db.rollback(save_point="invoice_ocr_party_profile")
+        frappe.log_error(frappe.get_traceback(), "OCR Party Profile Error")
+
+
+def update_page_counts(party_type, party, scripts):
+    name = frappe.db.get_value("OCR Party Profile", {"party_type": party_type, "party": party})
+    if name:
+        profile = frappe.get_doc("OCR Party Profile", name)
+    else:
+        profile = frappe.new_doc("OCR Party Profile")
+        profile.party_type = party_type
+        profile.party = party
+
+    profile.eng_pages = (profile.eng_pages or 0) + scripts.count("Latin")
+    profile.urd_pages = (profile.urd_pages or 0) + scripts.count("Arabic")
+    profile.learn_language()
+    profile.save(ignore_permissions=True)
@@ -0,0 +1,34 @@
+// Copyright (c) 2026, mohtashim and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["OCR Extraction Performance"] = {
+  filters: [
+    {
+      fieldname: "from_date",
+      label: __("From Date"),
+      fieldtype: "Date",
+      default: frappe.datetime.add_days(frappe.datetime.get_today(), -7),
+      reqd: 1,
+    },
+    {
+      fieldname: "to_date",
+      label: __("To Date"),
+      fieldtype: "Date",
+      default: frappe.datetime.get_today(),
+      reqd: 1,
+    },
+    {
+      fieldname: "group_by",
+      label: __("Group By"),
+      fieldtype: "Select",
+      options: ["Day", "Party", "Worker", "Template", "Priority"],
+      default: "Day",
+    },
+    {
+      fieldname: "party_type",
+      label: __("Party Type"),
+      fieldtype: "Select",
+      options: ["", "Customer", "Supplier"],
+    },
+  ],
+};
@@ -0,0 +1,112 @@
+# Copyright (c) 2026, mohtashim and contributors
+# For license information, please see license.txt
+
+import math
+
+import frappe
+from frappe.utils import add_days, flt, getdate
+
+STAGES = ("rasterize", "preprocess", "language", "tesseract", "parse", "item_match", "party_match", "save")
+GROUP_FIELDS = {
+    "Day": "creation", "Party": "party", "Worker": "worker", "Template": "template", "Priority": "priority",
+}
+
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    group_field = GROUP_FIELDS[filters.get("group_by") or "Day"]
+
+    log_filters = [
+        ["creation", ">=", getdate(filters.from_date)],
+        ["creation", "<", add_days(getdate(filters.to_date), 1)],
+    ]
+    if filters.party_type:
+        log_filters.append(["party_type", "=", filters.party_type])
+
+    logs = frappe.get_all(
+        "OCR Extraction Log",
+        filters=log_filters,
+        fields=["creation", "party", "worker", "template", "status", "page_count", "ocr_pages",
+                "cache_pages", "megapixels", "first_pass_pages", "escalated_pages", "total_time", "priority", "degraded",
+                "queue_wait_time", *(f"{stage}_time" for stage in STAGES)],
+        order_by="creation asc",
+    )
+
+    groups = {}
+    for log in logs:
+        key = getdate(log.creation) if group_field == "creation" else log.get(group_field) or ""
+        groups.setdefault(key, []).append(log)
+
+    return get_columns(filters), [get_row(key, group) for key, group in groups.items()]
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of a non empty list"""
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def get_row(key, logs):
+    pages = sum(log.page_count for log in logs)
+    total_time = sum(flt(log.total_time) for log in logs)
+    times = [flt(log.total_time) for log in logs]
+
+    row = {
+        "group": key,
+        "documents": len(logs),
+        "failed": sum(1 for log in logs if log.status == "Failed"),
+        "pages": pages,
+        "cache_hit_rate": 100 * sum(log.cache_pages for log in logs) / pages if pages else 0,
+        "megapixels": sum(flt(log.megapixels) for log in logs),
+        "first_pass_pages": sum(log.first_pass_pages or 0 for log in logs),
+        "escalated_pages": sum(log.escalated_pages or 0 for log in logs),
+        "avg_time": total_time / len(logs),
+        "p50_time": percentile(times, 0.5),
+        "p95_time": percentile(times, 0.95),
+        "queue_wait_time": sum(flt(log.queue_wait_time) for log in logs) / len(logs),
+        "degraded": sum(1 for log in logs if log.degraded),
+        # Pages a single worker gets through per minute
+        "pages_per_minute": 60 * pages / total_time if total_time else 0,
+    }
+    for stage in STAGES:
+        row[f"{stage}_time"] = sum(flt(log.get(f"{stage}_time")) for log in logs) / len(logs)
+    return row
+
+
+def get_columns(filters):
+    group_by = filters.get("group_by") or "Day"
+    group_column = {"fieldname": "group", "label": group_by, "width": 160}
+    if group_by == "Day":
+        group_column["fieldtype"] = "Date"
+    elif group_by == "Party":
+        group_column.update({"fieldtype": "Dynamic Link", "options": "party_type"})
+    elif group_by == "Template":
+        group_column.update({"fieldtype": "Link", "options": "OCR Extraction Template"})
+    else:
+        group_column["fieldtype"] = "Data"
+
+    columns = [
+        group_column,
+        {"fieldname": "documents", "label": "Documents", "fieldtype": "Int", "width": 100},
+        {"fieldname": "failed", "label": "Failed", "fieldtype": "Int", "width": 80},
+        {"fieldname": "pages", "label": "Pages", "fieldtype": "Int", "width": 80},
+        {"fieldname": "cache_hit_rate", "label": "Cache Hits", "fieldtype": "Percent", "width": 100},
+        {"fieldname": "megapixels", "label": "Megapixels", "fieldtype": "Float", "width": 110},
+        {"fieldname": "first_pass_pages", "label": "First Pass Pages", "fieldtype": "Int", "width": 130},
+        {"fieldname": "escalated_pages", "label": "Escalated Pages", "fieldtype": "Int", "width": 130},
+        {"fieldname": "avg_time", "label": "Avg Time (s)", "fieldtype": "Float", "precision": 2, "width": 110},
+        {"fieldname": "p50_time", "label": "P50 Time (s)", "fieldtype": "Float", "precision": 2, "width": 110},
+        {"fieldname": "p95_time", "label": "P95 Time (s)", "fieldtype": "Float", "precision": 2, "width": 110},
+        {"fieldname": "queue_wait_time", "label": "Avg Queue Wait (s)", "fieldtype": "Float", "precision": 2, "width": 140},
+        {"fieldname": "degraded", "label": "Degraded", "fieldtype": "Int", "width": 90},
+        {"fieldname": "pages_per_minute", "label": "Pages / Worker Minute", "fieldtype": "Float", "width": 160},
+    ]
+    for stage in STAGES:
+        columns.append({
+            "fieldname": f"{stage}_time",
+            "label": f"Avg {stage.replace('_', ' ').title()} (s)",
+            "fieldtype": "Float",
+            "precision": 3,
+            "width": 130,
+        })
+    return columns
@@ -0,0 +1,89 @@
+"""Fuzzy matching of OCR text against catalog entries.
+
+A trigram inverted index shortlists a few dozen candidates, which are then
+scored with a C-backed ratio (rapidfuzz or python-Levenshtein when installed,
+difflib otherwise) so large catalogs are never scanned linearly.
+"""
+
+import difflib
+from collections import defaultdict
+
+try:
+    from rapidfuzz.fuzz import ratio as _ratio
+
+    def similarity(a, b):
+        """Similarity of two strings on a 0-100 scale"""
+        return _ratio(a, b)
+
+except ImportError:
+    try:
+        from Levenshtein import ratio as _ratio
+
+        def similarity(a, b):
+            """Similarity of two strings on a 0-100 scale"""
+            return _ratio(a, b) * 100
+
+    except ImportError:
+
+        def similarity(a, b):
+            """Similarity of two strings on a 0-100 scale"""
+            return difflib.SequenceMatcher(None, a, b).ratio() * 100
+
+
+CANDIDATE_LIMIT = 50
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """Trigram index over a list of dict entries, searched by their "match_text" """
+
+    def __init__(self, entries, key="match_text"):
+        self.entries = entries
+        self.texts = [entry[key] for entry in entries]
+        self.gram_counts = []
+        self.postings = defaultdict(list)
+        self.exact = {}
+
+        for index, text in enumerate(self.texts):
+            self.exact.setdefault(text, index)
+            grams = trigrams(text)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(index)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, text):
+        """First entry whose match text is exactly text, if any"""
+        index = self.exact.get(text)
+        return None if index is None else self.entries[index]
+
+    def candidates(self, text, limit=CANDIDATE_LIMIT):
+        """Indexes of the entries sharing the most trigrams with text, in catalog order"""
+        if len(self.entries) <= limit:
+            return range(len(self.entries))
+
+        grams = trigrams(text)
+        shared = defaultdict(int)
+        for gram in grams:
+            for index in self.postings.get(gram, ()):
+                shared[index] += 1
+
+        # Rank by Dice coefficient so long entries don't win on overlap alone
+        query_count = len(grams)
+        ranked = sorted(
+            shared,
+            key=lambda index: shared[index] / (query_count + self.gram_counts[index]),
+            reverse=True,
+        )
+        return sorted(ranked[:limit])
+
+    def search(self, text, limit=CANDIDATE_LIMIT):
+        """Yield (entry, score) for the shortlisted candidates of text"""
+        for index in self.candidates(text, limit):
+            yield self.entries[index], similarity(text, self.texts[index])
@@ -0,0 +1,177 @@
+"""Extraction metrics.
+
+Every extraction run leaves an OCR Extraction Log with its per-stage timings,
+page and pixel counts and the worker that ran it. The same numbers are added
+to running counters in redis, which the prometheus endpoint below exposes in
+the Prometheus text format for scraping.
+"""
+
+import os
+import socket
+import time
+
+import frappe
+import redis
+from werkzeug.wrappers import Response
+
+COUNTERS_KEY = "invoice_ocr:metrics"
+PAGE_STAGES = ("rasterize", "preprocess", "language", "tesseract")
+# "ocr" is the wall time of the whole OCR run, page stages included
+DOCUMENT_STAGES = ("ocr", "parse", "item_match", "party_match", "save")
+PAGE_SOURCES = ("ocr", "text_layer", "cache")
+
+
+class StageTimer:
+    """Wall time per stage; lap(stage) charges the time since the previous lap to stage"""
+
+    def __init__(self):
+        self.timings = {}
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0) + now - self.last
+        self.last = now
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+
+def get_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def summarize_pages(pages):
+    """Page counts by source, pixel count and summed page stage timings of an OCR run"""
+    summary = {
+        "page_count": len(pages),
+        "pixels": sum(page["pixels"] for page in pages),
+        "first_pass_pages": sum(1 for page in pages if page["first_pass"] and page["source"] == "ocr"),
+        "escalated_pages": sum(1 for page in pages if page["escalated"] and page["source"] == "ocr"),
+        # Resolution each page was read at, 0 for text layer pages
+        "dpis": [page["dpi"] or 0 for page in pages],
+    }
+    for source in PAGE_SOURCES:
+        summary[f"{source}_pages"] = sum(1 for page in pages if page["source"] == source)
+    for stage in PAGE_STAGES:
+        summary[stage] = sum(page["timings"].get(stage, 0) for page in pages)
+    return summary
+
+
+def record_extraction(doc, status, error=None):
+    """Insert the OCR Extraction Log of an extraction run and add it to the counters"""
+    metrics = doc.flags.extraction_metrics
+    if not metrics:
+        return
+
+    timer = metrics["timer"]
+    total = timer.total()
+    pages = metrics.get("pages") or summarize_pages([])
+    timings = dict(timer.timings)
+    for stage in PAGE_STAGES:
+        timings[stage] = pages[stage]
+
+    frappe.get_doc({
+        "doctype": "OCR Extraction Log",
+        "invoice_upload": doc.name,
+        "status": status,
+        "party_type": doc.party_type,
+        "party": doc.party,
+        "template": metrics.get("template"),
+        "reused_from": metrics.get("reused_from"),
+        "priority": doc.ocr_priority,
+        "degraded": int(bool(metrics.get("degraded"))),
+        "queue_wait_time": doc.flags.queue_wait or 0,
+        "worker": get_worker_id(),
+        "page_count": pages["page_count"],
+        "ocr_pages": pages["ocr_pages"],
+        "text_layer_pages": pages["text_layer_pages"],
+        "cache_pages": pages["cache_pages"],
+        "megapixels": pages["pixels"] / 1e6,
+        "first_pass_pages": pages["first_pass_pages"],
+        "escalated_pages": pages["escalated_pages"],
+        "page_dpi": ", ".join(str(dpi) for dpi in pages["dpis"]),
+        "total_time": total,
+        "error": error,
+        **{f"{stage}_time": timings.get(stage, 0) for stage in PAGE_STAGES + DOCUMENT_STAGES},
+    }).insert(ignore_permissions=True)
+
+    increment_counters(status, pages, timings, total, doc.ocr_priority, doc.flags.queue_wait or 0)
+
+
+def increment_counters(status, pages, timings, total, priority=None, queue_wait=0):
+    cache = frappe.cache()
+    key = cache.make_key(COUNTERS_KEY)
+    pipe = cache.pipeline()
+    pipe.hincrby(key, f"extractions|{status}", 1)
+    if priority:
+        pipe.hincrby(key, f"jobs|{priority}", 1)
+        pipe.hincrbyfloat(key, f"queue_wait_seconds|{priority}", queue_wait)
+    for source in PAGE_SOURCES:
+        pipe.hincrby(key, f"pages|{source}", pages[f"{source}_pages"])
+    pipe.hincrby(key, "pixels|", pages["pixels"])
+    for dpi in pages["dpis"]:
+        if dpi:
+            pipe.hincrby(key, f"pages_by_dpi|{dpi}", 1)
+    pipe.hincrby(key, "escalated_pages|", pages["escalated_pages"])
+    for stage in PAGE_STAGES + DOCUMENT_STAGES:
+        pipe.hincrbyfloat(key, f"stage_seconds|{stage}", timings.get(stage, 0))
+    pipe.hincrbyfloat(key, "stage_seconds|total", total)
+    pipe.execute()
+
+
+METRICS = {
+    "extractions": ("counter", "status", "Extraction runs by outcome"),
+    "pages": ("counter", "source", "Pages by how their text was obtained"),
+    "pixels": ("counter", None, "Pixels handed to Tesseract"),
+    "pages_by_dpi": ("counter", "dpi", "OCR pages by the resolution they were finally read at"),
+    "escalated_pages": ("counter", None, "Pages read again at full resolution after the first pass"),
+    "stage_seconds": ("counter", "stage", "Seconds spent per stage; page stages are summed over pool processes"),
+    "jobs": ("counter", "priority", "Scheduled extraction jobs by priority"),
+    "queue_wait_seconds": ("counter", "priority", "Seconds scheduled jobs waited before starting"),
+}
+
+
+def get_prometheus_text():
+    cache = frappe.cache()
+    # The cache wrapper would unpickle the values; the counters are plain numbers
+    counters = redis.Redis.hgetall(cache, cache.make_key(COUNTERS_KEY)) or {}
+    lines = []
+    for metric, (metric_type, label, help_text) in METRICS.items():
+        name = f"invoice_ocr_{metric}_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for field, value in sorted(counters.items()):
+            field = frappe.safe_decode(field)
+            field_metric, _, label_value = field.partition("|")
+            if field_metric != metric:
+                continue
+            labels = f'{{{label}="{label_value}"}}' if label else ""
+            lines.append(f"{name}{labels} {float(frappe.safe_decode(value))}")
+
+    # Backlog, to size the OCR workers against
+    lines.append("# HELP invoice_ocr_uploads Invoice Uploads by OCR status")
+    lines.append("# TYPE invoice_ocr_uploads gauge")
+    for status, count in frappe.get_all(
+        "Invoice Upload", fields=["ocr_status", "count(name) as count"], group_by="ocr_status", as_list=True
+    ):
+        lines.append(f'invoice_ocr_uploads{{status="{status}"}} {count}')
+
+    lines.append("# HELP invoice_ocr_queued_pages Estimated pages waiting for OCR by priority")
+    lines.append("# TYPE invoice_ocr_queued_pages gauge")
+    for priority, pages in frappe.get_all(
+        "Invoice Upload",
+        filters={"ocr_status": "Queued"},
+        fields=["ocr_priority", "sum(ocr_page_estimate) as pages"],
+        group_by="ocr_priority",
+        as_list=True,
+    ):
+        lines.append(f'invoice_ocr_queued_pages{{priority="{priority}"}} {pages or 0}')
+    return "\n".join(lines) + "\n"
+
+
+@frappe.whitelist()
+def prometheus():
+    """Extraction metrics in the Prometheus text exposition format"""
+    frappe.only_for("System Manager")
+    return Response(get_prometheus_text(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,207 @@
+"""OCR engines behind a common interface.
+
+tesserocr keeps a TessBaseAPI, with its traineddata loaded, alive for the
+life of the process and takes numpy buffers directly. pytesseract, which
+starts the tesseract binary and reloads the models for every call, is the
+fallback when tesserocr is not installed or can't initialise.
+
+Both return recognised words as a WordTable, with boxes in the coordinates
+of the image that was passed in.
+
+tesserocr is only imported once its backend is created, in the process that
+runs it. Loading libtesseract loads libgomp, which reads OMP_THREAD_LIMIT
+right then; a pool process forked from a parent that had already imported it
+would ignore the limit set in pipeline._init_worker.
+"""
+
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytesseract
+
+HAS_TESSEROCR = importlib.util.find_spec("tesserocr") is not None
+
+from invoice_ocr.ocr.words import WordTable
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def image_to_data(self, image, lang, psm, oem, offset=(0, 0)):
+        data = pytesseract.image_to_data(
+            image, config=f"--psm {psm} --oem {oem} -l {lang}", output_type=pytesseract.Output.DICT
+        )
+        return WordTable.from_data(data, offset=offset)
+
+    def regions_to_data(self, image, boxes, lang, psm, oem):
+        return [
+            self.image_to_data(image[y:y + h, x:x + w], lang, psm, oem, offset=(x, y))
+            for x, y, w, h in boxes
+        ]
+
+    def detect_script(self, image):
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        return osd["script"], float(osd["script_conf"])
+
+
+class TesserocrBackend:
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        # One initialised engine per language set and engine mode
+        self.apis = {}
+
+    def get_api(self, lang, psm, oem):
+        api = self.apis.get((lang, oem))
+        if api is None:
+            api = self.tesserocr.PyTessBaseAPI(lang=lang, oem=oem)
+            self.apis[(lang, oem)] = api
+        api.SetPageSegMode(psm)
+        return api
+
+    def set_image(self, api, image):
+        if isinstance(image, np.ndarray):
+            image = np.ascontiguousarray(image)
+            height, width = image.shape[:2]
+            bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+        else:
+            api.SetImage(image)
+
+    def read_words(self, api):
+        """Recognise the current image or rectangle and collect its words"""
+        api.Recognize()
+        iterator = api.GetIterator()
+        if iterator is None:
+            return WordTable()
+
+        rows = []
+        block = par = line = 0
+        level = self.tesserocr.RIL.WORD
+        for word in self.tesserocr.iterate_level(iterator, level):
+            if word.IsAtBeginningOf(self.tesserocr.RIL.BLOCK):
+                block += 1
+            if word.IsAtBeginningOf(self.tesserocr.RIL.PARA):
+                par += 1
+            if word.IsAtBeginningOf(self.tesserocr.RIL.TEXTLINE):
+                line += 1
+
+            text = word.GetUTF8Text(level)
+            box = word.BoundingBox(level)
+            if not text or not text.strip() or not box:
+                continue
+            # Boxes come back in full image coordinates, rectangle or not
+            left, top, right, bottom = box
+            rows.append((text.strip(), word.Confidence(level), left, top, right - left, bottom - top, block, par, line))
+
+        if not rows:
+            return WordTable()
+        names = ("text", "conf", "left", "top", "width", "height", "block", "par", "line")
+        return WordTable(**dict(zip(names, zip(*rows))))
+
+    def image_to_data(self, image, lang, psm, oem):
+        api = self.get_api(lang, psm, oem)
+        self.set_image(api, image)
+        try:
+            return self.read_words(api)
+        finally:
+            api.Clear()
+
+    def regions_to_data(self, image, boxes, lang, psm, oem):
+        # The page is handed over once; each region is only a rectangle on it
+        api = self.get_api(lang, psm, oem)
+        self.set_image(api, image)
+        try:
+            tables = []
+            for x, y, w, h in boxes:
+                api.SetRectangle(x, y, w, h)
+                tables.append(self.read_words(api))
+            return tables
+        finally:
+            api.Clear()
+
+    def detect_script(self, image):
+        # psm 0: orientation and script detection only
+        api = self.get_api("osd", 0, 3)
+        self.set_image(api, image)
+        try:
+            osd = api.DetectOrientationScript()
+        finally:
+            api.Clear()
+        if not osd:
+            raise RuntimeError("Script detection failed")
+        return osd["script_name"], osd["script_conf"]
+
+
+# (pid, name) -> backend; keyed on pid so pool processes forked from a
+# worker never reuse the parent's engine
+_backends = {}
+
+
+def get_backend(name="auto"):
+    """Return the process wide backend, "auto" preferring tesserocr when installed"""
+    auto = name == "auto"
+    if auto:
+        name = "tesserocr" if HAS_TESSEROCR else "pytesseract"
+
+    key = (os.getpid(), name)
+    if key not in _backends:
+        if name == "tesserocr":
+            if not HAS_TESSEROCR:
+                raise ImportError("tesserocr is not installed")
+            try:
+                _backends[key] = TesserocrBackend()
+            except ImportError:
+                # Installed but unloadable, e.g. built against another libtesseract
+                if not auto:
+                    raise
+                _backends[key] = PytesseractBackend()
+        else:
+            _backends[key] = PytesseractBackend()
+    return _backends[key]
+
+
+def get_backend_name(name="auto"):
+    """Name of the backend get_backend(name) returns, without loading its engine"""
+    if name == "auto":
+        name = "tesserocr" if HAS_TESSEROCR else "pytesseract"
+    backend = _backends.get((os.getpid(), name))
+    return backend.name if backend else name
+
+
+def is_engine_loaded():
+    """Whether this process has loaded libtesseract, and with it libgomp"""
+    return "tesserocr" in sys.modules
+
+
+def call_backend(method, options, *args):
+    """Call a backend method, falling back from tesserocr to pytesseract in auto mode"""
+    backend = get_backend(options["backend"])
+    try:
+        return getattr(backend, method)(*args)
+    except RuntimeError:
+        # tesserocr raises RuntimeError when it can't load the traineddata
+        if options["backend"] != "auto" or backend.name == "pytesseract":
+            raise
+        _backends[(os.getpid(), "tesserocr")] = backend = PytesseractBackend()
+        return getattr(backend, method)(*args)
+
+
+def image_to_data(image, options):
+    """OCR an image (numpy array or PIL image) with the backend and settings in options, returning its words"""
+    return call_backend("image_to_data", options, image, options["lang"], options["psm"], options["oem"])
+
+
+def regions_to_data(image, boxes, options, psm):
+    """OCR (x, y, w, h) regions of a numpy image, one WordTable per region"""
+    return call_backend("regions_to_data", options, image, boxes, options["lang"], psm, options["oem"])
+
+
+def detect_script(image, backend="auto"):
+    """Return (script name, confidence) of the dominant script in an image"""
+    return get_backend(backend).detect_script(image)
@@ -0,0 +1,73 @@
+"""Cache of per-page OCR results, keyed on file content and pipeline settings.
+
+Entries live in the site's redis cache as one hash per document. Size based
+eviction is left to redis itself, which bench configures as allkeys-lru.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import cint
+
+CACHE_PREFIX = "invoice_ocr:ocr"
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+
+def get_file_hash(file_path):
+    """SHA-256 of the file contents, read in chunks"""
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_ttl():
+    ttl = frappe.conf.get("invoice_ocr_cache_ttl")
+    return DEFAULT_TTL if ttl is None else cint(ttl)
+
+
+def get_cache_key(file_hash, settings_fingerprint):
+    return f"{CACHE_PREFIX}:{file_hash}:{settings_fingerprint}"
+
+
+def get_pages(cache_key):
+    """Return (page number -> page, page count) for what is cached, page count may be None"""
+    if not get_ttl():
+        return {}, None
+
+    return split_entries(frappe.cache().hgetall(cache_key) or {})
+
+
+def split_entries(cached):
+    """(page number -> page, page count) of a document's cache hash"""
+    # The cache wrapper unpickles the values but hands the field names back as bytes
+    entries = {frappe.safe_decode(field): entry for field, entry in cached.items()}
+    page_count = entries.pop("page_count", None)
+    return {int(page_no): page for page_no, page in entries.items()}, page_count
+
+
+def set_pages(cache_key, pages, page_count):
+    """Store page number -> page for a document and refresh its expiry"""
+    ttl = get_ttl()
+    if not ttl or not pages:
+        return
+
+    cache = frappe.cache()
+    cache.hset(cache_key, "page_count", page_count)
+    for page_no, page in pages.items():
+        cache.hset(cache_key, str(page_no), to_entry(page))
+    cache.expire(cache.make_key(cache_key), ttl)
+
+
+def to_entry(page):
+    """Cache entry of a page, read back by pipeline.make_cached_page"""
+    return {
+        "text": page["text"],
+        "lang": page["lang"],
+        "script": page["script"],
+        "words": page["words"].to_dict() if page["words"] is not None else None,
+        "dpi": page["dpi"],
+        "first_pass": page["first_pass"],
+        "escalated": page["escalated"],
+    }
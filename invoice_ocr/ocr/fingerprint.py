@@ -0,0 +1,119 @@
+"""Perceptual fingerprints of a document's first page.
+
+Two scans of the same paper invoice differ byte for byte, but look alike
+once reduced to a few dozen pixels. The page is straightened, since a degree
+of skew already moves the bottom lines by a line height, and cropped to its
+ink, so scanner margins and slightly different crops line up. It is then
+hashed with pHash: signs of the low DCT frequencies of a thumbnail against
+their median, which shrugs off contrast, brightness and small shifts.
+
+    phash        64 bits from a 32x32 thumbnail, used to find candidates
+    detail_hash  256 bits from a 64x64 thumbnail, used to confirm them
+
+Invoices from one supplier share a layout, so their 64 bit hashes are close
+too; the detail hash still tells them apart (on rendered invoices, rescans
+were within 16 bits and different invoices of one layout 50 or more apart).
+
+Hashes are kept as hex. For lookup, the 64 bit hash is split into BANDS
+bands of 8 bits: two hashes within BANDS - 1 bits of each other share at
+least one band exactly, so indexed equality on the bands finds every
+candidate without comparing against the whole table.
+"""
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from invoice_ocr.ocr.pipeline import rasterize_page
+
+# Resolution the first page is rasterized at; the hashes only look at 64x64 pixels
+FINGERPRINT_DPI = 72
+BANDS = 8
+BAND_BITS = 64 // BANDS
+# Pixels darker than this count as ink when cropping
+INK_THRESHOLD = 160
+# Largest skew straightened, in degrees, and the steps of the coarse and fine search
+MAX_SKEW = 3
+SKEW_STEPS = (0.25, 0.05)
+
+
+def crop_to_ink(gray):
+    """The part of a grayscale page that has ink on it, the whole page if it is blank"""
+    ink = gray < INK_THRESHOLD
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if len(rows) < 2 or len(cols) < 2:
+        return gray
+    return gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def rotate(gray, angle, border):
+    height, width = gray.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=border)
+
+
+def get_skew(gray):
+    """Rotation in degrees that levels the text lines of a grayscale page"""
+    ink = crop_to_ink(gray) < INK_THRESHOLD
+    ink = ink.astype(np.uint8) * 255
+
+    def sharpness(angle):
+        # Level text lines turn the row sums into sharp peaks and gaps.
+        # Ties, as on a blank page, go to the smallest rotation
+        rows = rotate(ink, angle, 0).sum(axis=1, dtype=np.float64)
+        return np.square(np.diff(rows)).sum(), -abs(angle)
+
+    best, span = 0.0, MAX_SKEW
+    for step in SKEW_STEPS:
+        best = max(np.arange(best - span, best + span + step / 2, step), key=sharpness)
+        span = step
+    return round(float(best), 2)
+
+
+def deskew(gray):
+    angle = get_skew(gray)
+    if abs(angle) < SKEW_STEPS[-1]:
+        return gray
+    # Rotate the whole page, margins included, so no ink is cut off at the corners
+    margin = int(np.ceil(max(gray.shape) * np.sin(np.radians(abs(angle)))))
+    padded = cv2.copyMakeBorder(gray, margin, margin, margin, margin, cv2.BORDER_CONSTANT, value=255)
+    return rotate(padded, angle, 255)
+
+
+def phash(gray, size):
+    """pHash of size x size bits, as hex"""
+    small = cv2.resize(gray, (size * 4, size * 4), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:size, :size].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):0{size * size // 4}x}"
+
+
+def fingerprint_image(image):
+    """(phash, detail_hash) of a PIL image"""
+    gray = crop_to_ink(deskew(np.asarray(image.convert("L"))))
+    return phash(gray, 8), phash(gray, 16)
+
+
+def fingerprint_file(file_path):
+    """(phash, detail_hash) of the first page of a PDF or image file"""
+    if file_path.lower().endswith(".pdf"):
+        image = rasterize_page(file_path, 1, dpi=FINGERPRINT_DPI)
+    else:
+        image = Image.open(file_path)
+    try:
+        return fingerprint_image(image)
+    finally:
+        image.close()
+
+
+def get_bands(hex_hash):
+    value = int(hex_hash, 16)
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * band)) & mask for band in range(BANDS)]
+
+
+def distance(hash_a, hash_b):
+    """Hamming distance between two hex hashes"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
@@ -0,0 +1,40 @@
+"""Per-page choice of Tesseract languages.
+
+Running eng+urd roughly doubles recognition time, so each page gets a cheap
+orientation and script detection (Tesseract OSD) pass on a downscaled copy
+first. Latin pages are then read with eng only; Arabic script pages, or pages
+the probe is unsure about, keep eng+urd. Only the script the probe was sure of
+is reported, so undecided pages don't teach a party's profile anything.
+"""
+
+import cv2
+import numpy as np
+
+from invoice_ocr.ocr import backends
+
+DEFAULT_LANG = "eng+urd"
+SCRIPT_LANGS = {"Latin": "eng", "Arabic": "eng+urd"}
+MIN_SCRIPT_CONFIDENCE = 1.0
+
+# OSD only needs glyph shapes; probing at this width keeps it cheap
+PROBE_WIDTH = 1600
+
+
+def downscale(image):
+    if not isinstance(image, np.ndarray) or image.shape[1] <= PROBE_WIDTH:
+        return image
+    height = round(image.shape[0] * PROBE_WIDTH / image.shape[1])
+    return cv2.resize(image, (PROBE_WIDTH, height), interpolation=cv2.INTER_AREA)
+
+
+def detect_language(image, backend="auto"):
+    """(Tesseract languages, script) for a page; DEFAULT_LANG and None when the script can't be told"""
+    try:
+        script, confidence = backends.detect_script(downscale(image), backend)
+    except Exception:
+        # Too little text to decide, or no osd.traineddata installed
+        return DEFAULT_LANG, None
+
+    if confidence < MIN_SCRIPT_CONFIDENCE:
+        return DEFAULT_LANG, None
+    return SCRIPT_LANGS.get(script, DEFAULT_LANG), script
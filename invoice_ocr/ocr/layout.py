@@ -0,0 +1,186 @@
+"""Region of interest OCR.
+
+Works on the binarized page (black text on white) that preprocessing
+produces. Ruling lines locate the item table; the remaining ink is merged
+into text blocks, dropping specks and dense graphics such as logos and
+stamps. Only those regions go through Tesseract, so blank margins and
+artwork cost nothing, and a ruled table is read cell by cell and returned
+as "cell | cell | cell" lines, the format extract_table_items parses first.
+
+This needs the in-process tesserocr engine, which reads every region off one
+loaded image. pytesseract would start the tesseract binary once per region,
+so with it pages are read whole.
+"""
+
+import cv2
+import numpy as np
+
+from invoice_ocr.ocr import backends
+from invoice_ocr.ocr.words import WordTable
+
+# Tesseract page segmentation for a uniform block of text
+BLOCK_PSM = 6
+
+# Ruling lines: minimum length as a fraction of page width / height
+HORIZONTAL_LINE_FRACTION = 1 / 25
+VERTICAL_LINE_FRACTION = 1 / 40
+MIN_TABLE_WIDTH_FRACTION = 0.5
+
+# Text blocks: words are merged with a kernel of this fraction of the page
+BLOCK_MERGE_FRACTION = (1 / 50, 1 / 150)
+MIN_BLOCK_AREA_FRACTION = 0.0005
+MAX_BLOCK_INK_DENSITY = 0.5
+
+REGION_PADDING = 8
+MIN_CELL_SIZE = 12
+CELL_INSET = 4
+# Table bands taller than this fraction of the page hold several item lines
+MAX_ROW_HEIGHT_FRACTION = 0.04
+
+
+def find_line_positions(mask, axis, min_fill):
+    """Centres of the runs of rows (axis=1) or columns (axis=0) that are mostly line pixels"""
+    filled = np.flatnonzero(np.count_nonzero(mask, axis=axis) >= min_fill)
+    if not len(filled):
+        return []
+    runs = np.split(filled, np.flatnonzero(np.diff(filled) > 1) + 1)
+    return [int(run.mean()) for run in runs]
+
+
+def find_table(ink):
+    """Locate the ruled item table, returning (bbox, row lines, column lines, lines mask) or None"""
+    height, width = ink.shape
+    horizontal = cv2.morphologyEx(
+        ink, cv2.MORPH_OPEN,
+        cv2.getStructuringElement(cv2.MORPH_RECT, (max(int(width * HORIZONTAL_LINE_FRACTION), 1), 1))
+    )
+    vertical = cv2.morphologyEx(
+        ink, cv2.MORPH_OPEN,
+        cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(int(height * VERTICAL_LINE_FRACTION), 1)))
+    )
+    lines = cv2.bitwise_or(horizontal, vertical)
+
+    rows = find_line_positions(horizontal, 1, width * MIN_TABLE_WIDTH_FRACTION)
+    columns = find_line_positions(vertical, 0, 1)
+
+    # With vertical rules, the table is the horizontal rules they span;
+    # rules elsewhere on the page (under a letterhead, above a footer) are not part of it
+    if columns:
+        spanned = np.flatnonzero(np.count_nonzero(vertical, axis=1))
+        rows = [y for y in rows if spanned[0] - MIN_CELL_SIZE <= y <= spanned[-1] + MIN_CELL_SIZE]
+    if len(rows) < 2:
+        return None
+
+    top, bottom = rows[0], rows[-1]
+    ruled = np.flatnonzero(np.count_nonzero(horizontal[top:bottom + 1], axis=0))
+    left, right = int(ruled[0]), int(ruled[-1])
+    columns = [x for x in columns if left - MIN_CELL_SIZE <= x <= right + MIN_CELL_SIZE]
+
+    return (left, top, right - left, bottom - top), rows, columns, lines
+
+
+def find_text_blocks(ink, lines, exclude=None):
+    """Bounding boxes of text blocks, skipping specks, dense graphics and the excluded box"""
+    height, width = ink.shape
+    text = cv2.subtract(ink, lines)
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(int(width * BLOCK_MERGE_FRACTION[0]), 1), max(int(height * BLOCK_MERGE_FRACTION[1]), 1))
+    )
+    merged = cv2.dilate(text, kernel)
+    contours = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+    blocks = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < width * height * MIN_BLOCK_AREA_FRACTION:
+            continue
+        if exclude and overlaps((x, y, w, h), exclude):
+            continue
+        if cv2.countNonZero(text[y:y + h, x:x + w]) / (w * h) > MAX_BLOCK_INK_DENSITY:
+            continue
+        blocks.append((x, y, w, h))
+    return blocks
+
+
+def overlaps(box, other):
+    x, y, w, h = box
+    ox, oy, ow, oh = other
+    centre_x, centre_y = x + w / 2, y + h / 2
+    return ox <= centre_x <= ox + ow and oy <= centre_y <= oy + oh
+
+
+def pad(box, shape):
+    x, y, w, h = box
+    left, top = max(x - REGION_PADDING, 0), max(y - REGION_PADDING, 0)
+    right = min(x + w + REGION_PADDING, shape[1])
+    bottom = min(y + h + REGION_PADDING, shape[0])
+    return left, top, right - left, bottom - top
+
+
+def get_table_regions(rows, columns, max_row_height):
+    """(top, kind, boxes) for each band between two row rules of the table.
+
+    Bands of a single text line are split into cells, inset so the rules
+    themselves are not read as characters. Taller bands (several unruled
+    item lines) are read as one block.
+    """
+    regions = []
+    for top, bottom in zip(rows, rows[1:]):
+        if bottom - top < MIN_CELL_SIZE:
+            continue
+        if bottom - top > max_row_height:
+            regions.append((top, "block", [(columns[0], top, columns[-1] - columns[0], bottom - top)]))
+            continue
+
+        cells = [
+            (left + CELL_INSET, top + CELL_INSET, right - left - 2 * CELL_INSET, bottom - top - 2 * CELL_INSET)
+            for left, right in zip(columns, columns[1:])
+            if right - left >= MIN_CELL_SIZE
+        ]
+        if cells:
+            regions.append((top, "row", cells))
+    return regions
+
+
+def ocr_regions(binary, options):
+    """OCR only the text blocks and the item table of a binarized page.
+
+    Returns (text, words), or None when no regions are found or the backend
+    is not tesserocr, so the caller can OCR the full page.
+    """
+    if backends.get_backend_name(options["backend"]) != "tesserocr":
+        return None
+
+    ink = cv2.bitwise_not(binary)
+    table = find_table(ink)
+    lines = table[3] if table else np.zeros_like(ink)
+    table_box = table[0] if table else None
+
+    # (top, kind, boxes) in reading order
+    regions = [(y, "block", [pad((x, y, w, h), binary.shape)]) for x, y, w, h in
+               find_text_blocks(ink, lines, exclude=table_box)]
+
+    if table and len(table[2]) >= 3:
+        regions.extend(get_table_regions(table[1], table[2], binary.shape[0] * MAX_ROW_HEIGHT_FRACTION))
+    elif table_box:
+        regions.append((table_box[1], "block", [pad(table_box, binary.shape)]))
+
+    if not regions:
+        return None
+
+    regions.sort(key=lambda region: region[0])
+    boxes = [box for _, _, region_boxes in regions for box in region_boxes]
+    region_words = backends.regions_to_data(binary, boxes, options, BLOCK_PSM)
+    words = iter(region_words)
+
+    output = []
+    for _, kind, region_boxes in regions:
+        tables = [next(words) for _ in region_boxes]
+        if kind == "row":
+            if any(len(cell) for cell in tables):
+                output.append(" | ".join(cell.join() for cell in tables))
+        elif len(tables[0]):
+            output.append(tables[0].to_text().strip())
+
+    return "\n".join(output) + "\n", WordTable.concat(region_words)
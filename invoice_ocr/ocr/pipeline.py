@@ -0,0 +1,322 @@
+"""Page level OCR pipeline.
+
+Nothing in here touches frappe, so pages can be processed in worker processes.
+Every page comes back as a dict:
+
+    text    recognised or embedded text
+    error   message of a non fatal problem, logged by the caller
+    lang    Tesseract languages the page was read with
+    script  script detected with confidence, None when lang was given or undecided
+    source  "ocr", "text_layer" or "cache"
+    words   WordTable of the recognised words, None for text layer pages
+    timings seconds spent per stage (rasterize, preprocess, language, tesseract)
+    pixels  pixel count of the image handed to Tesseract
+    dpi     resolution the page was read at, None for text layer pages
+    first_pass  True when the low resolution first pass was good enough
+    escalated   True when the page was read again at full resolution
+
+With a first_pass_dpi, OCR pages are first read at that resolution without
+upscaling, which is a fraction of the pixels of the full path. Only pages
+whose words come back with a mean confidence below escalate_below_conf (or
+with hardly any words) are read again at dpi with the full preprocessing.
+"""
+
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from invoice_ocr.ocr import backends, language, layout, preprocess
+from invoice_ocr.ocr.words import WordTable
+
+DEFAULT_OPTIONS = {
+    "dpi": 300,
+    "use_text_layer": True,
+    "preprocess": preprocess.DEFAULT_PARAMS,
+    # Tesseract settings, "--psm 4 --oem 3 -l <lang>"; "auto" picks lang per page
+    "lang": "auto",
+    "psm": 4,
+    "oem": 3,
+    "backend": "auto",
+    # OCR only the detected text blocks and item table instead of the whole page
+    "layout": True,
+    # Resolution of the first pass, None to read every page at dpi straight away
+    "first_pass_dpi": None,
+    "escalate_below_conf": 80,
+}
+
+# A first pass page with fewer words is read again, it may just have been unreadable
+FIRST_PASS_MIN_WORDS = 5
+
+# Words the item extractors anchor on; a text layer of a few lines containing one is trusted.
+# A lone footer or stamp ("Invoice generated by ...") on a scanned page is not
+TEXT_LAYER_KEYWORDS = ("QUANTITY", "UNIT PRICE", "AMOUNT", "PARTICULARS", "INVOICE")
+TEXT_LAYER_MIN_CHARS = 50
+TEXT_LAYER_MIN_LINES = 3
+TEXT_LAYER_MIN_CHARS_WITHOUT_KEYWORD = 200
+TEXT_LAYER_MIN_PRINTABLE_RATIO = 0.9
+
+# Bumped whenever the shape of a page changes, so older cache entries are not reused
+PAGE_FORMAT = 4
+
+
+def get_options(**overrides):
+    """A copy of the default pipeline options with overrides applied"""
+    options = copy.deepcopy(DEFAULT_OPTIONS)
+    options.update(overrides)
+    return options
+
+
+def make_page(text, source, error=None, lang=None, words=None, timings=None, pixels=0, dpi=None, script=None):
+    return {
+        "text": text, "error": error, "lang": lang, "script": script, "source": source, "words": words,
+        "timings": timings or {}, "pixels": pixels, "dpi": dpi, "first_pass": False, "escalated": False,
+    }
+
+
+def make_cached_page(cached):
+    """Page from a cache entry, see cache.set_pages"""
+    words = cached.get("words")
+    page = make_page(
+        cached["text"], "cache", lang=cached.get("lang"), words=WordTable.from_dict(words) if words else None,
+        dpi=cached.get("dpi"), script=cached.get("script"),
+    )
+    page["first_pass"] = cached.get("first_pass", False)
+    page["escalated"] = cached.get("escalated", False)
+    return page
+
+
+def ocr_image(pil_img, options, dpi=None):
+    """Preprocess and OCR one page"""
+    error = None
+    timings = {}
+    start = time.perf_counter()
+    try:
+        processed = preprocess.preprocess_image(pil_img, options["preprocess"], dpi=dpi)
+    except Exception as e:
+        error = f"Image processing failed: {str(e)}"
+        processed = pil_img  # OCR the original if processing fails
+    timings["preprocess"] = time.perf_counter() - start
+
+    lang, script = options["lang"], None
+    if lang == "auto":
+        start = time.perf_counter()
+        lang, script = language.detect_language(processed, options["backend"])
+        timings["language"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    options = dict(options, lang=lang)
+    result = None
+    if options["layout"] and error is None:
+        result = layout.ocr_regions(processed, options)
+    if result is None:
+        words = backends.image_to_data(processed, options)
+        result = words.to_text(), words
+    timings["tesseract"] = time.perf_counter() - start
+
+    text, words = result
+    pixels = processed.size if hasattr(processed, "ndim") else pil_img.width * pil_img.height
+    return make_page(
+        text, "ocr", error=error, lang=lang, script=script, words=words, timings=timings, pixels=int(pixels),
+        dpi=round(dpi or preprocess.estimate_dpi(pil_img)),
+    )
+
+
+def get_first_pass_options(options):
+    return dict(options, preprocess=dict(options["preprocess"], scale=1))
+
+
+def needs_escalation(page, options):
+    """Whether a first pass page should be read again at full resolution"""
+    if page["error"] or page["words"] is None or len(page["words"]) < FIRST_PASS_MIN_WORDS:
+        return True
+    conf = page["words"].mean_conf()
+    return conf is None or conf < options["escalate_below_conf"]
+
+
+def ocr_adaptive(read, options):
+    """OCR a page with read(options, dpi), first at first_pass_dpi when set; dpi None is the full path"""
+    if not options["first_pass_dpi"]:
+        return read(options, None)
+
+    page = read(get_first_pass_options(options), options["first_pass_dpi"])
+    if not needs_escalation(page, options):
+        page["first_pass"] = True
+        return page
+    return escalate(page, read(options, None))
+
+
+def escalate(first_page, page):
+    """The full resolution page, charged with the time and pixels of the first pass too"""
+    for stage, seconds in first_page["timings"].items():
+        page["timings"][stage] = page["timings"].get(stage, 0) + seconds
+    page["pixels"] += first_page["pixels"]
+    page["escalated"] = True
+    return page
+
+
+def get_settings_fingerprint(options):
+    """Short digest of every setting that changes the text produced for a page"""
+    settings = dict(options)
+    # Every backend runs the same tesseract library, but only tesserocr reads by region
+    backend = settings.pop("backend")
+    settings["layout"] = settings["layout"] and backends.get_backend_name(backend) == "tesserocr"
+    settings["page_format"] = PAGE_FORMAT
+    if settings["use_text_layer"]:
+        settings["text_layer_rules"] = [
+            TEXT_LAYER_KEYWORDS,
+            TEXT_LAYER_MIN_CHARS,
+            TEXT_LAYER_MIN_LINES,
+            TEXT_LAYER_MIN_CHARS_WITHOUT_KEYWORD,
+            TEXT_LAYER_MIN_PRINTABLE_RATIO,
+        ]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def extract_text_layer(file_path):
+    """Return the embedded text of every PDF page, or None if the PDF can't be read"""
+    try:
+        reader = PdfReader(file_path)
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception:
+        return None
+
+
+def is_usable_text_layer(text):
+    """Decide whether an embedded text layer is good enough to skip OCR"""
+    content = "".join(text.split())
+    if len(content) < TEXT_LAYER_MIN_CHARS:
+        return False
+    if sum(1 for line in text.splitlines() if line.strip()) < TEXT_LAYER_MIN_LINES:
+        return False
+
+    # Fonts without a unicode map come out as "(cid:12)" or replacement chars
+    if "(cid:" in content:
+        return False
+    printable = sum(1 for char in content if char.isprintable() and char != "\ufffd")
+    if printable / len(content) < TEXT_LAYER_MIN_PRINTABLE_RATIO:
+        return False
+
+    upper = text.upper()
+    if any(keyword in upper for keyword in TEXT_LAYER_KEYWORDS):
+        return True
+    return len(content) >= TEXT_LAYER_MIN_CHARS_WITHOUT_KEYWORD
+
+
+def is_text_layer_page(page):
+    # Cached pages don't keep their source, but only OCR records a resolution
+    return page["source"] == "text_layer" or (page["source"] == "cache" and page["dpi"] is None)
+
+
+def get_page_count(file_path):
+    return pdfinfo_from_path(file_path)["Pages"]
+
+
+def rasterize_page(file_path, page_no, dpi=300):
+    """Rasterize a single PDF page (1-based) without touching the others"""
+    return convert_from_path(file_path, dpi=dpi, first_page=page_no, last_page=page_no)[0]
+
+
+def read_pdf_page(file_path, page_no, options, dpi):
+    """Rasterize and OCR one PDF page, releasing the bitmap straight after"""
+    start = time.perf_counter()
+    img = rasterize_page(file_path, page_no, dpi=dpi)
+    rasterize_time = time.perf_counter() - start
+    try:
+        page = ocr_image(img, options, dpi=dpi)
+    finally:
+        img.close()
+    page["timings"]["rasterize"] = rasterize_time
+    return page
+
+
+def ocr_pdf_page(file_path, page_no, options):
+    def read(options, dpi):
+        return read_pdf_page(file_path, page_no, options, dpi or options["dpi"])
+    return ocr_adaptive(read, options)
+
+
+def read_image(img, options, dpi):
+    """OCR an image file as scanned, or scaled down to dpi when that is below its own resolution"""
+    native_dpi = preprocess.estimate_dpi(img)
+    if not dpi or dpi >= native_dpi:
+        return ocr_image(img, options)
+    scale = dpi / native_dpi
+    with img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS) as scaled:
+        return ocr_image(scaled, options, dpi=dpi)
+
+
+def _init_worker(omp_threads):
+    # Each pool process runs its own tesseract; cap its OpenMP threads so
+    # processes x threads does not exceed the cores we were given
+    os.environ["OMP_THREAD_LIMIT"] = str(omp_threads)
+
+
+def get_pool_context():
+    # Forked pool processes would inherit a libgomp this process already loaded, and
+    # with it no thread limit; fresh ones from a fork server load their own
+    return multiprocessing.get_context("forkserver" if backends.is_engine_loaded() else "fork")
+
+
+def ocr_pdf_pages(file_path, page_numbers, options, workers):
+    """OCR PDF pages in a pool of worker processes that lives as long as the document"""
+    # A pool kept for the next document would outlive RQ's work horse, which exits without atexit
+    omp_threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_pool_context(), initializer=_init_worker, initargs=(omp_threads,)
+    ) as pool:
+        return list(pool.map(ocr_pdf_page, repeat(file_path), page_numbers, repeat(options)))
+
+
+def ocr_pdf(file_path, options, workers=1, known_pages=None):
+    """OCR a PDF page by page, returning the pages in page order.
+
+    Pages in known_pages (page number -> page, e.g. from a cache) are reused.
+    Pages with a usable embedded text layer (digitally generated PDFs) are
+    taken as is; only the rest are rasterized and sent through Tesseract.
+    Only page numbers are handed out, each process rasterizes its own page, so
+    memory is bounded by one page per process regardless of document length.
+    """
+    known_pages = known_pages or {}
+    text_layer = extract_text_layer(file_path) if options["use_text_layer"] else None
+    page_count = len(text_layer) if text_layer is not None else get_page_count(file_path)
+
+    pages = [None] * page_count
+    for index in range(page_count):
+        if index + 1 in known_pages:
+            pages[index] = make_cached_page(known_pages[index + 1])
+        elif text_layer and is_usable_text_layer(text_layer[index]):
+            # Keep pages on separate lines once they are joined back together
+            pages[index] = make_page(text_layer[index].rstrip("\n") + "\n", "text_layer")
+
+    page_numbers = [index + 1 for index, page in enumerate(pages) if page is None]
+    workers = min(workers, len(page_numbers))
+    if workers <= 1:
+        results = [ocr_pdf_page(file_path, page_no, options) for page_no in page_numbers]
+    else:
+        results = ocr_pdf_pages(file_path, page_numbers, options, workers)
+
+    for page_no, result in zip(page_numbers, results):
+        pages[page_no - 1] = result
+    return pages
+
+
+def ocr_file(file_path, options=None, workers=1, known_pages=None):
+    """OCR a PDF or image file, returning one dict per page"""
+    options = options or get_options()
+    if file_path.lower().endswith(".pdf"):
+        return ocr_pdf(file_path, options, workers=workers, known_pages=known_pages)
+
+    if known_pages and 1 in known_pages:
+        return [make_cached_page(known_pages[1])]
+
+    with Image.open(file_path) as img:
+        return [ocr_adaptive(lambda options, dpi: read_image(img, options, dpi), options)]
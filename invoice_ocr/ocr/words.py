@@ -0,0 +1,220 @@
+"""Word level OCR output.
+
+Tesseract reports every word it recognises with its box, its block, paragraph
+and line ids and a confidence. A WordTable keeps those as parallel numpy
+arrays, so a page is a handful of arrays rather than thousands of dicts. It
+pickles cheaply to and from pool processes, and the extractors can lay words
+out in rows and columns by geometry instead of re-parsing a text string.
+"""
+
+import numpy as np
+
+INT_COLUMNS = ("left", "top", "width", "height", "block", "par", "line", "page")
+
+
+class WordTable:
+    """Parallel arrays of word text, box, block/par/line ids, page and confidence (0-100, -1 unknown)"""
+
+    def __init__(self, text=(), conf=None, **columns):
+        self.text = list(text)
+        count = len(self.text)
+        for column in INT_COLUMNS:
+            values = columns.get(column)
+            setattr(self, column, np.zeros(count, np.int32) if values is None else np.asarray(values, np.int32))
+        self.conf = np.full(count, -1, np.float32) if conf is None else np.asarray(conf, np.float32)
+
+    def __len__(self):
+        return len(self.text)
+
+    @classmethod
+    def from_data(cls, data, offset=(0, 0)):
+        """Build from pytesseract's image_to_data dict, keeping word level rows only"""
+        keep = [
+            index for index, (level, text) in enumerate(zip(data["level"], data["text"]))
+            if int(level) == 5 and text and text.strip()
+        ]
+
+        def column(name):
+            return [data[name][index] for index in keep]
+
+        return cls(
+            text=[data["text"][index].strip() for index in keep],
+            conf=[float(conf) for conf in column("conf")],
+            left=np.asarray(column("left"), np.int32) + offset[0],
+            top=np.asarray(column("top"), np.int32) + offset[1],
+            width=column("width"),
+            height=column("height"),
+            block=column("block_num"),
+            par=column("par_num"),
+            line=column("line_num"),
+        )
+
+    @classmethod
+    def from_text(cls, text):
+        """Words of plain text (e.g. a PDF text layer), with lines and paragraphs but no boxes"""
+        words, pars, lines = [], [], []
+        par = line = 0
+        for text_line in text.splitlines():
+            line_words = text_line.split()
+            if not line_words:
+                par += 1
+                continue
+            line += 1
+            words.extend(line_words)
+            pars.extend([par] * len(line_words))
+            lines.extend([line] * len(line_words))
+        return cls(text=words, par=pars, line=lines)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        """Plain lists, for JSON and the OCR cache"""
+        data = {column: getattr(self, column).tolist() for column in INT_COLUMNS}
+        data["text"] = list(self.text)
+        data["conf"] = [round(conf, 2) for conf in self.conf.tolist()]
+        return data
+
+    @classmethod
+    def concat(cls, tables):
+        """Join tables, renumbering blocks so ids stay unique"""
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls()
+
+        offset = 0
+        blocks = []
+        for table in tables:
+            blocks.append(table.block + offset)
+            offset = int(blocks[-1].max()) + 1
+
+        columns = {column: np.concatenate([getattr(table, column) for table in tables]) for column in INT_COLUMNS}
+        columns["block"] = np.concatenate(blocks)
+        return cls(
+            text=[word for table in tables for word in table.text],
+            conf=np.concatenate([table.conf for table in tables]),
+            **columns,
+        )
+
+    def set_page(self, page):
+        self.page[:] = page
+        return self
+
+    @property
+    def has_boxes(self):
+        return bool(self.width.any())
+
+    def join(self, indexes=None):
+        """Words at indexes (all by default) separated by single spaces"""
+        if indexes is None:
+            return " ".join(self.text)
+        return " ".join(self.text[index] for index in indexes)
+
+    def mean_conf(self, indexes=None):
+        """Mean confidence of the words at indexes, None when none is known"""
+        conf = self.conf if indexes is None else self.conf[np.asarray(indexes, np.intp)]
+        conf = conf[conf >= 0]
+        return round(float(conf.mean()), 2) if len(conf) else None
+
+    def to_text(self):
+        """Lay the words out as Tesseract's plain text output does: a line per
+        text line and a blank line after every paragraph"""
+        output = []
+        previous = None
+        for index, word in enumerate(self.text):
+            key = (self.page[index], self.block[index], self.par[index], self.line[index])
+            if previous is not None:
+                if key[:3] != previous[:3]:
+                    output.append("\n\n")
+                elif key != previous:
+                    output.append("\n")
+                else:
+                    output.append(" ")
+            output.append(word)
+            previous = key
+        if output:
+            output.append("\n")
+        return "".join(output)
+
+    def visual_lines(self):
+        """Index arrays of the words sharing a text line on the page, top to bottom and left to right.
+
+        Lines are found from the boxes rather than Tesseract's line ids, so a
+        table row read cell by cell still comes back as one line.
+        """
+        boxed = np.flatnonzero(self.width > 0)
+        if not len(boxed):
+            return []
+
+        centre = self.top + self.height / 2
+        bottom = self.top + self.height
+        order = boxed[np.lexsort((self.left[boxed], centre[boxed], self.page[boxed]))]
+
+        lines = []
+        current = [order[0]]
+        line_bottom = bottom[order[0]]
+        for index in order[1:]:
+            if self.page[index] == self.page[current[0]] and centre[index] <= line_bottom:
+                current.append(index)
+                line_bottom = max(line_bottom, bottom[index])
+            else:
+                lines.append(current)
+                current = [index]
+                line_bottom = bottom[index]
+        lines.append(current)
+
+        return [np.asarray(sorted(line, key=lambda index: self.left[index])) for line in lines]
+
+    def group_titles(self, line):
+        """Split a line into runs of words separated by less than a word height, e.g. column titles"""
+        gap_limit = np.median(self.height[line])
+        titles = [[line[0]]]
+        for previous, index in zip(line, line[1:]):
+            if self.left[index] - (self.left[previous] + self.width[previous]) > gap_limit:
+                titles.append([])
+            titles[-1].append(index)
+        return titles
+
+    def read_table(self, headers):
+        """Find the first line holding every header and cut the lines below it into columns.
+
+        Column titles are the runs of words on the header line; the boundary
+        between two columns is the midpoint of the gap between their titles and
+        each word goes to the column its centre falls in. Returns (column of
+        each header, rows) where a row is (cells, top, bottom) with one array
+        of word indexes per column, or None if no header line is found.
+        """
+        lines = self.visual_lines()
+        for number, line in enumerate(lines):
+            line_text = self.join(line).upper()
+            if all(header in line_text for header in headers):
+                break
+        else:
+            return None
+
+        titles = self.group_titles(line)
+        title_texts = [self.join(title).upper() for title in titles]
+        columns = []
+        for header in headers:
+            # A header whose words were spaced out as two titles is found by its first word
+            column = next((i for i, title in enumerate(title_texts) if header in title), None)
+            if column is None:
+                column = next((i for i, title in enumerate(title_texts) if header.split()[0] in title), None)
+            if column is None:
+                return None
+            columns.append(column)
+
+        bounds = [
+            (self.left[left[-1]] + self.width[left[-1]] + self.left[right[0]]) / 2
+            for left, right in zip(titles, titles[1:])
+        ]
+
+        rows = []
+        for row in lines[number + 1:]:
+            if self.page[row[0]] != self.page[line[0]]:
+                break
+            assignment = np.searchsorted(bounds, self.left[row] + self.width[row] / 2)
+            cells = [row[assignment == column] for column in range(len(titles))]
+            rows.append((cells, int(self.top[row].min()), int((self.top[row] + self.height[row]).max())))
+        return columns, rows
@@ -0,0 +1,44 @@
+"""Choice of the OCR jobs to start next.
+
+Extraction requests wait in the site's own queue (Invoice Uploads in the
+Queued status) and only a few per site are handed to the shared RQ queue at
+a time, so one site's month-end dump can't fill the queue ahead of everyone
+else. When a slot frees up, interactive requests go first. Among the rest,
+the owner with the fewest pages in flight is served next, so a user with
+one receipt is not stuck behind a colleague's two thousand pages. Ties go to
+the job queued first.
+"""
+
+from collections import defaultdict
+
+PRIORITIES = ("Interactive", "Bulk")
+
+
+def get_rank(priority):
+    return PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+
+
+def plan_dispatch(queued, in_flight, slots):
+    """Pick up to slots jobs out of queued.
+
+    Jobs are dicts with name, owner, priority, pages and queued_at; in_flight
+    are the jobs already running. Each pick is charged to its owner's load
+    before the next one is chosen.
+    """
+    load = defaultdict(int)
+    for job in in_flight:
+        load[job["owner"]] += job["pages"]
+
+    waiting = list(queued)
+    picked = []
+    while waiting and len(picked) < slots:
+        job = min(waiting, key=lambda job: (get_rank(job["priority"]), load[job["owner"]], job["queued_at"]))
+        waiting.remove(job)
+        load[job["owner"]] += job["pages"]
+        picked.append(job)
+    return picked
+
+
+def is_degraded(job, backlog_pages, threshold):
+    """Whether a job runs in the cheaper degraded mode: bulk jobs while the backlog is over threshold"""
+    return bool(threshold) and job["priority"] == "Bulk" and backlog_pages >= threshold
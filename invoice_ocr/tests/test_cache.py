@@ -0,0 +1,28 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+try:
+	from invoice_ocr.ocr import cache
+except ImportError:
+	# Needs the bench virtualenv
+	cache = None
+
+
+@unittest.skipIf(cache is None, "frappe is not importable")
+class TestSplitEntries(unittest.TestCase):
+	def test_bytes_field_names(self):
+		# As RedisWrapper.hgetall returns them
+		pages, page_count = cache.split_entries({
+			b"page_count": 2,
+			b"1": {"text": "first"},
+			b"2": {"text": "second"},
+		})
+		self.assertEqual(page_count, 2)
+		self.assertEqual(pages, {1: {"text": "first"}, 2: {"text": "second"}})
+
+	def test_partial_document(self):
+		pages, page_count = cache.split_entries({b"2": {"text": "second"}})
+		self.assertIsNone(page_count)
+		self.assertEqual(list(pages), [2])
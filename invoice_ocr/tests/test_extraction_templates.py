@@ -0,0 +1,58 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+from invoice_ocr.extraction_templates import ExtractionTemplate, find_template
+
+TEXT = """ACME TRADERS
+Supplier: Acme Traders Pvt Ltd
+Description  Qty  Rate  Amount
+Paracetamol Syrup 250ml  5  80.00  400.00
+Vitamin D3 Drops  2  1,150.00  2,300.00
+Sub Total  2,700.00
+Freight  1  500.00  500.00
+"""
+
+
+def make_template(**overrides):
+	fields = {
+		"name": "Acme",
+		"fingerprint": "acme traders",
+		"table_start": r"^Description\s+Qty",
+		"table_end": r"^Sub\s*Total",
+		"row_pattern": r"^(?P<description>.+?)\s+(?P<qty>\d+)\s+(?P<rate>[\d,]+\.\d{2})",
+		"party_pattern": r"Supplier\s*:\s*(?P<party>.+)",
+	}
+	fields.update(overrides)
+	return ExtractionTemplate(**fields)
+
+
+class TestExtractionTemplate(unittest.TestCase):
+	def test_extracts_rows_between_anchors(self):
+		items = make_template().extract_items(TEXT)
+		self.assertEqual(items, [
+			{"description": "Paracetamol Syrup 250ml", "qty": 5.0, "rate": 80.0},
+			{"description": "Vitamin D3 Drops", "qty": 2.0, "rate": 1150.0},
+		])
+
+	def test_missing_start_anchor_finds_nothing(self):
+		self.assertEqual(make_template(table_start="^Particulars").extract_items(TEXT), [])
+
+	def test_extracts_party(self):
+		self.assertEqual(make_template().extract_party(TEXT), "Acme Traders Pvt Ltd")
+
+	def test_rejects_bad_rules(self):
+		with self.assertRaises(ValueError):
+			make_template(row_pattern=r"(?P<description>.+)")
+		with self.assertRaises(ValueError):
+			make_template(table_start="(")
+
+	def test_party_template_wins_over_fingerprint(self):
+		by_fingerprint = make_template(priority=10)
+		by_party = make_template(name="Acme Supplier", fingerprint="", party_type="Supplier", party="ACME-001")
+		templates = [by_fingerprint, by_party]
+
+		self.assertIs(find_template(templates, "Supplier", "ACME-001", TEXT), by_party)
+		self.assertIs(find_template(templates, "Supplier", None, TEXT), by_fingerprint)
+		self.assertIsNone(find_template(templates, "Supplier", None, "Other Invoice"))
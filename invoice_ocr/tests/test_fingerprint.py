@@ -0,0 +1,61 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from invoice_ocr.benchmarks import corpus
+from invoice_ocr.ocr.fingerprint import BANDS, distance, fingerprint_image, get_bands, get_skew
+
+MAX_DISTANCE = 24
+
+
+def render(seed):
+	catalog = corpus.make_catalog(200, seed=0)
+	parties = corpus.make_parties(5, seed=0)
+	page = corpus.render_invoice(corpus.make_invoice(catalog, parties, 20, seed=seed))[0]
+	return page.resize((page.width // 4, page.height // 4))
+
+
+def rescan(page, angle=0.3):
+	page = page.rotate(angle, fillcolor=255).crop((10, 8, page.width - 6, page.height - 15))
+	page = ImageEnhance.Contrast(page).enhance(0.7)
+	return Image.eval(page, lambda value: min(255, value + 15))
+
+
+class TestFingerprint(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.pages = [render(seed) for seed in (1, 2)]
+
+	def test_rescan_is_near(self):
+		phash, detail_hash = fingerprint_image(self.pages[0])
+		rescan_phash, rescan_detail_hash = fingerprint_image(rescan(self.pages[0]))
+		self.assertLess(distance(phash, rescan_phash), BANDS)
+		self.assertLessEqual(distance(detail_hash, rescan_detail_hash), MAX_DISTANCE)
+
+	def test_skewed_rescan_is_near(self):
+		phash, detail_hash = fingerprint_image(self.pages[0])
+		for angle in (1, -1):
+			rescan_phash, rescan_detail_hash = fingerprint_image(rescan(self.pages[0], angle))
+			self.assertLess(distance(phash, rescan_phash), BANDS)
+			self.assertLessEqual(distance(detail_hash, rescan_detail_hash), MAX_DISTANCE)
+
+	def test_skew_is_measured(self):
+		gray = np.asarray(self.pages[0].rotate(1.5, fillcolor=255))
+		self.assertAlmostEqual(get_skew(gray), -1.5, delta=0.1)
+		self.assertEqual(get_skew(np.full((100, 100), 255, np.uint8)), 0)
+
+	def test_other_invoice_of_the_same_layout_is_far(self):
+		_, detail_hash = fingerprint_image(self.pages[0])
+		_, other_detail_hash = fingerprint_image(self.pages[1])
+		self.assertGreater(distance(detail_hash, other_detail_hash), MAX_DISTANCE)
+
+	def test_close_hashes_share_a_band(self):
+		phash = "86bbb1b19f810f07"
+		# Flip one bit in each of BANDS - 1 bands
+		flipped = f"{int(phash, 16) ^ sum(1 << (8 * band) for band in range(BANDS - 1)):016x}"
+		self.assertEqual(distance(phash, flipped), BANDS - 1)
+		self.assertTrue(set(enumerate(get_bands(phash))) & set(enumerate(get_bands(flipped))))
@@ -0,0 +1,53 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import os
+import tempfile
+import unittest
+
+from invoice_ocr import folder_watch
+from invoice_ocr.folder_watch import FolderWatcher
+
+
+class TestFolderWatcher(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.TemporaryDirectory()
+		self.addCleanup(self.folder.cleanup)
+		inotify = folder_watch.INotify
+		folder_watch.INotify = None
+		self.addCleanup(setattr, folder_watch, "INotify", inotify)
+		self.watcher = FolderWatcher([self.folder.name], (".pdf",), settle_seconds=5)
+
+	def write(self, name, content=b"%PDF-1.4"):
+		path = os.path.join(self.folder.name, name)
+		with open(path, "ab") as f:
+			f.write(content)
+		return path
+
+	def test_file_is_ready_once_settled(self):
+		path = self.write("bill.pdf")
+		self.assertEqual(self.watcher.scan(now=0), [])
+		self.assertEqual(self.watcher.scan(now=4), [])
+		self.assertEqual(self.watcher.scan(now=5), [path])
+
+	def test_growing_file_waits(self):
+		path = self.write("bill.pdf")
+		self.watcher.scan(now=0)
+		self.write("bill.pdf", b" more pages")
+		self.assertEqual(self.watcher.scan(now=5), [])
+		self.assertEqual(self.watcher.scan(now=10), [path])
+
+	def test_handled_file_is_not_handed_out_again(self):
+		path = self.write("bill.pdf")
+		self.watcher.scan(now=0)
+		self.assertEqual(self.watcher.scan(now=5), [path])
+		self.watcher.mark_handled(path)
+		self.assertEqual(self.watcher.scan(now=10), [])
+		self.assertEqual(self.watcher.scan(now=20), [])
+
+	def test_ignores_other_and_temporary_files(self):
+		self.write("notes.txt")
+		self.write(".bill.pdf")
+		self.write("~bill.pdf")
+		self.watcher.scan(now=0)
+		self.assertEqual(self.watcher.scan(now=5), [])
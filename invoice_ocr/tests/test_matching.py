@@ -0,0 +1,37 @@
+# Copyright (c) 2025, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+from invoice_ocr.matching import FuzzyIndex, similarity
+
+
+class TestFuzzyIndex(unittest.TestCase):
+	def setUp(self):
+		self.entries = [{"item_name": f"ITEM-{i:05d}", "match_text": f"filler product {i:05d}"} for i in range(500)]
+		self.entries.append({"item_name": "PARA-250", "match_text": "paracetamol syrup 250ml"})
+		self.entries.append({"item_name": "TRAM-100", "match_text": "tramadol tablet 100mg"})
+		self.index = FuzzyIndex(self.entries)
+
+	def best(self, text):
+		return max(self.index.search(text), key=lambda result: result[1])
+
+	def test_shortlist_contains_best_match(self):
+		entry, score = self.best("paracetamol syrup 250 ml")
+		self.assertEqual(entry["item_name"], "PARA-250")
+		self.assertGreater(score, 90)
+
+	def test_shortlist_is_bounded(self):
+		self.assertLessEqual(len(list(self.index.search("product 00042", limit=20))), 20)
+
+	def test_small_catalog_scores_everything(self):
+		index = FuzzyIndex(self.entries[:3])
+		self.assertEqual(len(list(index.search("zzz"))), 3)
+
+	def test_exact_lookup(self):
+		self.assertEqual(self.index.lookup("tramadol tablet 100mg")["item_name"], "TRAM-100")
+		self.assertIsNone(self.index.lookup("tramadol"))
+
+	def test_similarity_scale(self):
+		self.assertEqual(similarity("abc", "abc"), 100)
+		self.assertEqual(similarity("abc", "xyz"), 0)
@@ -0,0 +1,112 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from invoice_ocr.ocr import backends, language, layout, pipeline
+from invoice_ocr.ocr.words import WordTable
+
+
+def make_reader(conf_by_dpi, word_count=20):
+	"""A read(options, dpi) returning words of the given confidence per dpi (None is the full path)"""
+	calls = []
+
+	def read(options, dpi):
+		calls.append((dpi, options["preprocess"]["scale"]))
+		words = WordTable(["word"] * word_count, conf=[conf_by_dpi[dpi]] * word_count)
+		return pipeline.make_page(
+			words.to_text(), "ocr", words=words, timings={"tesseract": 1.0}, pixels=100, dpi=dpi or 300
+		)
+
+	return read, calls
+
+
+class TestAdaptiveResolution(unittest.TestCase):
+	def setUp(self):
+		self.options = pipeline.get_options(first_pass_dpi=150, escalate_below_conf=80)
+
+	def test_confident_first_pass_is_kept(self):
+		read, calls = make_reader({150: 92})
+		page = pipeline.ocr_adaptive(read, self.options)
+		self.assertEqual(calls, [(150, 1)])
+		self.assertTrue(page["first_pass"])
+		self.assertFalse(page["escalated"])
+		self.assertEqual(page["dpi"], 150)
+
+	def test_low_confidence_escalates(self):
+		read, calls = make_reader({150: 60, None: 91})
+		page = pipeline.ocr_adaptive(read, self.options)
+		self.assertEqual(calls, [(150, 1), (None, 2)])
+		self.assertTrue(page["escalated"])
+		self.assertEqual(page["dpi"], 300)
+		# Charged with both reads
+		self.assertEqual(page["timings"]["tesseract"], 2.0)
+		self.assertEqual(page["pixels"], 200)
+
+	def test_too_few_words_escalate(self):
+		read, calls = make_reader({150: 95, None: 95}, word_count=2)
+		self.assertTrue(pipeline.ocr_adaptive(read, self.options)["escalated"])
+
+	def test_without_first_pass(self):
+		read, calls = make_reader({None: 50})
+		page = pipeline.ocr_adaptive(read, pipeline.get_options())
+		self.assertEqual(calls, [(None, 2)])
+		self.assertFalse(page["first_pass"] or page["escalated"])
+
+
+class TestRegionOCR(unittest.TestCase):
+	def test_pytesseract_reads_the_whole_page(self):
+		# One tesseract process per region would cost more than it saves
+		page = np.full((200, 200), 255, np.uint8)
+		page[50:60, 20:180] = 0
+		self.assertIsNone(layout.ocr_regions(page, pipeline.get_options(backend="pytesseract")))
+
+	def test_cache_key_leaves_the_engine_unloaded(self):
+		# Pool processes forked later must load libgomp themselves, under their thread limit
+		pipeline.get_settings_fingerprint(pipeline.get_options())
+		self.assertFalse(backends.is_engine_loaded())
+		self.assertEqual(pipeline.get_pool_context().get_start_method(), "fork")
+
+	def test_cache_key_follows_the_region_path(self):
+		self.assertEqual(
+			pipeline.get_settings_fingerprint(pipeline.get_options(backend="pytesseract")),
+			pipeline.get_settings_fingerprint(pipeline.get_options(backend="pytesseract", layout=False)),
+		)
+
+
+class TestTextLayer(unittest.TestCase):
+	def test_invoice_text_is_used(self):
+		text = "Invoice INV/2026/0042\nPartner Name: Acme Traders\nQUANTITY UNIT PRICE AMOUNT\n2.000 150.00 300.00\n"
+		self.assertTrue(pipeline.is_usable_text_layer(text))
+
+	def test_footer_on_a_scan_is_not(self):
+		# The scanner software stamps one line of text onto an image page
+		self.assertFalse(pipeline.is_usable_text_layer("Invoice scanned with OfficeScan Pro 4.2 on 2026-10-18\n"))
+		self.assertFalse(pipeline.is_usable_text_layer("INVOICE\nPage 1\n"))
+
+	def test_unmapped_fonts_are_not(self):
+		self.assertFalse(pipeline.is_usable_text_layer("(cid:12)(cid:40)(cid:7)\n" * 10))
+
+	def test_cached_text_layer_page(self):
+		page = pipeline.make_cached_page({"text": "INVOICE\n"})
+		self.assertTrue(pipeline.is_text_layer_page(page))
+		page = pipeline.make_cached_page({"text": "INVOICE\n", "dpi": 150})
+		self.assertFalse(pipeline.is_text_layer_page(page))
+
+
+class TestLanguageDetection(unittest.TestCase):
+	def detect(self, result):
+		with patch.object(backends, "detect_script", side_effect=[result]):
+			return language.detect_language(np.full((100, 100), 255, np.uint8))
+
+	def test_confident_script(self):
+		self.assertEqual(self.detect(("Latin", 4.2)), ("eng", "Latin"))
+		self.assertEqual(self.detect(("Arabic", 3.0)), ("eng+urd", "Arabic"))
+
+	def test_undecided_page_reports_no_script(self):
+		# Read with both languages, but not counted as an Urdu page
+		self.assertEqual(self.detect(("Arabic", 0.4)), ("eng+urd", None))
+		self.assertEqual(self.detect(RuntimeError("Too few characters")), ("eng+urd", None))
@@ -0,0 +1,43 @@
+# Copyright (c) 2026, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+from invoice_ocr.scheduling import is_degraded, plan_dispatch
+
+
+def make_job(name, owner, priority="Bulk", pages=1, queued_at=0):
+	return {"name": name, "owner": owner, "priority": priority, "pages": pages, "queued_at": queued_at}
+
+
+class TestPlanDispatch(unittest.TestCase):
+	def test_interactive_goes_first(self):
+		queued = [make_job("bulk", "a", queued_at=0), make_job("click", "b", "Interactive", queued_at=5)]
+		self.assertEqual([job["name"] for job in plan_dispatch(queued, [], 1)], ["click"])
+
+	def test_owner_with_least_in_flight_goes_first(self):
+		in_flight = [make_job("running", "a", pages=500)]
+		queued = [make_job("a2", "a", queued_at=0), make_job("b1", "b", queued_at=9)]
+		self.assertEqual([job["name"] for job in plan_dispatch(queued, in_flight, 1)], ["b1"])
+
+	def test_picks_are_charged_to_their_owner(self):
+		queued = [
+			make_job("a1", "a", pages=100, queued_at=0),
+			make_job("a2", "a", pages=100, queued_at=1),
+			make_job("b1", "b", pages=1, queued_at=2),
+		]
+		self.assertEqual([job["name"] for job in plan_dispatch(queued, [], 2)], ["a1", "b1"])
+
+	def test_no_slots(self):
+		self.assertEqual(plan_dispatch([make_job("a1", "a")], [], 0), [])
+
+
+class TestDegraded(unittest.TestCase):
+	def test_bulk_over_threshold(self):
+		self.assertTrue(is_degraded(make_job("a1", "a"), 500, 200))
+
+	def test_interactive_never_degraded(self):
+		self.assertFalse(is_degraded(make_job("a1", "a", "Interactive"), 500, 200))
+
+	def test_disabled_without_threshold(self):
+		self.assertFalse(is_degraded(make_job("a1", "a"), 500, 0))
@@ -0,0 +1,70 @@
+# Copyright (c) 2025, mohtashim and Contributors
+# See license.txt
+
+import unittest
+
+from invoice_ocr.ocr.words import WordTable
+
+
+def make_words(rows):
+	"""WordTable from (text, left, top, width) rows, every word 20px high"""
+	return WordTable(
+		text=[row[0] for row in rows],
+		conf=[90] * len(rows),
+		left=[row[1] for row in rows],
+		top=[row[2] for row in rows],
+		width=[row[3] for row in rows],
+		height=[20] * len(rows),
+		block=[1] * len(rows),
+		line=[row[2] for row in rows],
+	)
+
+
+class TestWordTable(unittest.TestCase):
+	def test_from_data_keeps_words_only(self):
+		data = {
+			"level": [1, 4, 5, 5, 5],
+			"text": ["", "", "Invoice", " ", "No"],
+			"conf": ["-1", "-1", "96.5", "-1", "91"],
+			"left": [0, 10, 10, 60, 80],
+			"top": [0, 5, 5, 5, 5],
+			"width": [500, 100, 45, 5, 20],
+			"height": [700, 20, 20, 20, 20],
+			"block_num": [0, 1, 1, 1, 1],
+			"par_num": [0, 1, 1, 1, 1],
+			"line_num": [0, 1, 1, 1, 1],
+		}
+		words = WordTable.from_data(data, offset=(100, 200))
+		self.assertEqual(words.text, ["Invoice", "No"])
+		self.assertEqual(words.left.tolist(), [110, 180])
+		self.assertEqual(words.top.tolist(), [205, 205])
+		self.assertEqual(words.mean_conf(), 93.75)
+
+	def test_text_round_trip(self):
+		text = "Invoice No 12\nDate 2025\n\nTotal 100\n"
+		self.assertEqual(WordTable.from_text(text).to_text(), text)
+
+	def test_concat_and_dict_round_trip(self):
+		words = WordTable.concat([WordTable.from_text("a b\n"), WordTable.from_text("c\n")])
+		self.assertEqual(words.to_text(), "a b\n\nc\n")
+		self.assertEqual(WordTable.from_dict(words.to_dict()).to_text(), words.to_text())
+
+	def test_read_table_assigns_columns_by_position(self):
+		words = make_words([
+			("DESCRIPTION", 10, 100, 150), ("QUANTITY", 400, 100, 110),
+			("UNIT", 600, 100, 50), ("PRICE", 660, 100, 60), ("AMOUNT", 850, 100, 90),
+			# Cells read separately, slightly off the line
+			("Paracetamol", 10, 140, 140), ("Syrup", 160, 142, 70), ("10.000", 430, 141, 70),
+			("80.00", 640, 140, 60), ("800.00", 860, 139, 70),
+		])
+		columns, rows = words.read_table(("QUANTITY", "UNIT PRICE", "AMOUNT"))
+		self.assertEqual(columns, [1, 2, 3])
+		self.assertEqual(len(rows), 1)
+		cells = rows[0][0]
+		self.assertEqual(words.join(cells[0]), "Paracetamol Syrup")
+		self.assertEqual(words.join(cells[1]), "10.000")
+		self.assertEqual(words.join(cells[2]), "80.00")
+
+	def test_read_table_without_header(self):
+		words = make_words([("Invoice", 10, 10, 80)])
+		self.assertIsNone(words.read_table(("QUANTITY", "UNIT PRICE", "AMOUNT")))
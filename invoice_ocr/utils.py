@@ -1,10 +1,5 @@
 import frappe
 import json
-import pytesseract
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
-from frappe.utils.file_manager import get_file_path
-from PIL import Image
 
 @frappe.whitelist()
 def create_invoice(name):